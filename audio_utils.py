@@ -0,0 +1,60 @@
+import subprocess
+import wave
+
+import numpy as np
+
+
+def load_clip(path, sample_rate, channels=2):
+    # Decodes any format ffmpeg understands into a float32 (samples, channels) array.
+    pcm = subprocess.run(
+        ["ffmpeg", "-loglevel", "error", "-i", path, "-f", "f32le", "-ac", str(channels), "-ar", str(sample_rate), "-"],
+        stdout=subprocess.PIPE,
+        check=True,
+    ).stdout
+    return np.frombuffer(pcm, dtype=np.float32).reshape(-1, channels)
+
+
+class AudioTimeline:
+    # A sample-accurate replacement for repeated AudioSegment.overlay: clips are only placed when
+    # overlaid and are mixed a chunk at a time on export, so the cost is linear in the number of
+    # clips regardless of how much they overlap.
+    def __init__(self, duration_ms, sample_rate, channels=2):
+        self.length = round(duration_ms*sample_rate/1000)
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.placements = []
+
+    def overlay(self, clip, position_ms, gain=1.0):
+        # like AudioSegment.overlay, anything past the end of the timeline is cut off
+        start = round(position_ms*self.sample_rate/1000)
+        if start < 0:
+            clip, start = clip[-start:], 0
+        if len(clip) and start < self.length:
+            self.placements.append((start, clip, gain))
+
+    def export(self, path, chunk_seconds=10):
+        chunk_length = chunk_seconds*self.sample_rate
+        placements = sorted(self.placements, key=lambda placement: placement[0])
+        next_placement = 0
+        active = []
+
+        with wave.open(path, "wb") as fh:
+            fh.setnchannels(self.channels)
+            fh.setsampwidth(2)
+            fh.setframerate(self.sample_rate)
+
+            for start in range(0, self.length, chunk_length):
+                end = min(start + chunk_length, self.length)
+
+                while next_placement < len(placements) and placements[next_placement][0] < end:
+                    active.append(placements[next_placement])
+                    next_placement += 1
+
+                chunk = np.zeros((end - start, self.channels), dtype=np.float32)
+                for clip_start, clip, gain in active:
+                    lo, hi = max(start, clip_start), min(end, clip_start + len(clip))
+                    if lo < hi:
+                        chunk[lo - start:hi - start] += gain*clip[lo - clip_start:hi - clip_start]
+                active = [placement for placement in active if placement[0] + len(placement[1]) > end]
+
+                fh.writeframes((np.clip(chunk, -1, 1)*32767).astype("<i2").tobytes())
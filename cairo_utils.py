@@ -0,0 +1,382 @@
+import math
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing.shared_memory import SharedMemory
+
+import cairocffi as cairo
+import numpy as np
+from cairosvg.bounding_box import calculate_bounding_box
+from cairosvg.helpers import size as svg_length
+from cairosvg.parser import Tree
+from cairosvg.surface import PDFSurface, PNGSurface
+from PIL import Image
+
+from utils import hex_to_rgb, svg_template
+
+
+def surface_to_image(surface):
+    # cairo's ARGB32 is premultiplied BGRA in memory (on little-endian machines), which PIL can
+    # unpack straight into straight-alpha RGBA
+    surface.flush()
+    return Image.frombytes(
+        "RGBA",
+        (surface.get_width(), surface.get_height()),
+        bytes(surface.get_data()),
+        "raw",
+        "BGRa",
+        surface.get_stride(),
+    )
+
+
+def svg_to_image(svg, dpi=96):
+    # Rasterizes SVG source into an RGBA image entirely in memory; there's no output file, so no
+    # PNG is encoded or decoded along the way.
+    return surface_to_image(PNGSurface(Tree(bytestring=svg.encode()), None, dpi).cairo)
+
+
+# shapes a tile can skip when they're entirely outside it
+CULLED_TAGS = {"path", "rect", "circle", "ellipse", "line", "polyline", "polygon"}
+
+
+class TileSurface(PNGSurface):
+    # Renders just the (left, top, right, bottom) box of a document, onto a surface that size.
+    # Everything else about the document (its size, percentages, masks) is worked out as usual.
+    # Shapes that fall entirely outside the box aren't drawn at all, which is where cairosvg spends
+    # its time; clipping alone would still pay for every node.
+    def __init__(self, tree, box, dpi=96):
+        self.box = box
+        super().__init__(tree, None, dpi)
+
+    def _create_surface(self, width, height):
+        left, top, right, bottom = self.box
+        return cairo.ImageSurface(cairo.FORMAT_ARGB32, right - left, bottom - top), width, height
+
+    def set_context_size(self, width, height, viewbox, tree):
+        # nested <svg> elements set their own context size too, but only the root is offset
+        if tree.parent is None:
+            self.context.translate(-self.box[0], -self.box[1])
+        super().set_context_size(width, height, viewbox, tree)
+
+    def outside_tile(self, node):
+        # Shapes with their own transform, filters or markers can reach past their bounding box in
+        # ways that aren't worth working out, so they're always drawn.
+        if node.tag not in CULLED_TAGS or "transform" in node or "filter" in node:
+            return False
+        if any(key.startswith("marker") for key in node):
+            return False
+        bounding_box = calculate_bounding_box(self, node)
+        if bounding_box is None:
+            return False
+
+        x, y, width, height = bounding_box
+        # strokes reach at most half the miter limit times their width past the outline
+        pad = 0
+        if node.get("stroke", "none") != "none":
+            pad = svg_length(self, node.get("stroke-width", "1"))*float(node.get("stroke-miterlimit", 4))/2
+        corners = [
+            self.context.user_to_device(corner_x, corner_y)
+            for corner_x in (x - pad, x + width + pad)
+            for corner_y in (y - pad, y + height + pad)
+        ]
+        xs, ys = zip(*corners)
+        left, top, right, bottom = self.box
+        # a pixel of slack for antialiasing
+        return max(xs) < -1 or min(xs) > right - left + 1 or max(ys) < -1 or min(ys) > bottom - top + 1
+
+    def draw(self, node):
+        if not self.outside_tile(node):
+            super().draw(node)
+
+
+class PlacedSurface(PDFSurface):
+    # Draws a document as vectors onto an existing cairo surface (e.g. the current page of a PDF),
+    # with its top left corner at position, in pixels.
+    def __init__(self, tree, target, position, dpi=96):
+        self.target = target
+        self.position = position
+        super().__init__(tree, None, dpi)
+
+    def _create_surface(self, width, height):
+        return self.target, width, height
+
+    def set_context_size(self, width, height, viewbox, tree):
+        if tree.parent is None:
+            self.context.translate(*self.position)
+        super().set_context_size(width, height, viewbox, tree)
+
+
+class _SizeSurface(PNGSurface):
+    # works out the size a document would render at, without drawing it
+    def _create_surface(self, width, height):
+        return cairo.ImageSurface(cairo.FORMAT_ARGB32, 1, 1), round(width), round(height)
+
+    def draw(self, node):
+        pass
+
+
+def svg_size(svg, dpi=96):
+    surface = _SizeSurface(Tree(bytestring=svg.encode()), None, dpi)
+    return surface.width, surface.height
+
+
+def band_boxes(size, bands):
+    # splits a (width, height) canvas into the given number of full-width horizontal bands
+    width, height = size
+    band_height = math.ceil(height/bands)
+    for top in range(0, height, band_height):
+        yield 0, top, width, min(top + band_height, height)
+
+
+_tile_svg = None
+_tile_dpi = 96
+_tile_shm = None
+_tile_canvas = None
+
+
+def _init_tile_renderer(svg, shm_name, size, dpi):
+    global _tile_svg, _tile_canvas, _tile_shm, _tile_dpi
+    width, height = size
+    _tile_svg, _tile_dpi = svg, dpi
+    _tile_shm = SharedMemory(name=shm_name)
+    _tile_canvas = np.ndarray((height, width, 4), dtype=np.uint8, buffer=_tile_shm.buf)
+
+
+def _render_tile(box):
+    left, top, right, bottom = box
+    # cairosvg rewrites parts of the tree (e.g. masks) as it draws, so each band parses its own
+    tile = surface_to_image(TileSurface(Tree(bytestring=_tile_svg), box, _tile_dpi).cairo)
+    _tile_canvas[top:bottom, left:right] = np.asarray(tile)
+
+
+def render_tiled(svg, size, workers=None, dpi=96):
+    # Rasterizes a large (width, height) document across a process pool, one horizontal band per
+    # worker. Every band parses the whole document, so there are only as many bands as workers,
+    # and each band skips the shapes outside it. Bands are written straight into a shared-memory
+    # canvas. Returns an RGBA image.
+    width, height = size
+    workers = workers or os.cpu_count()
+    shm = SharedMemory(create=True, size=width*height*4)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_tile_renderer,
+            initargs=(svg.encode(), shm.name, size, dpi),
+        ) as pool:
+            list(pool.map(_render_tile, band_boxes(size, workers)))
+        return Image.frombytes("RGBA", size, shm.buf)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+class SpriteCache:
+    # Rasterizes each icon once into an RGBA sprite cropped to its bounding box, and pastes that
+    # sprite wherever the icon is placed. Icons are functions shape(cx, cy, radius, color) returning
+    # SVG. Like GlyphCache, sprites are also keyed on the subpixel offset of the placement, so they
+    # match rendering the icon in place.
+    def __init__(self):
+        self.sprites = {}
+
+    def sprite(self, shape, radius, color, scale=1, offset=(0, 0)):
+        key = (shape, radius, color, scale, offset)
+        if key not in self.sprites:
+            # icons stay within 1.5 radii of their center (the moon is drawn off center)
+            margin = math.ceil(1.5*radius*scale) + 1
+            image = svg_to_image(svg_template(2*margin, 2*margin, [
+                f'<g transform="translate({margin + offset[0]} {margin + offset[1]}) scale({scale})">',
+                shape(0, 0, radius, color),
+                '</g>',
+            ]))
+            left, top, right, bottom = image.getbbox() or (0, 0, 0, 0)
+            self.sprites[key] = image.crop((left, top, right, bottom)), (left - margin, top - margin)
+        return self.sprites[key]
+
+    def paste(self, img, cx, cy, shape, radius, color, scale=1):
+        sprite, (dx, dy) = self.sprite(shape, radius, color, scale, (math.modf(cx)[0], math.modf(cy)[0]))
+        img.paste(sprite, (int(cx) + dx, int(cy) + dy), sprite)
+
+
+# the color names the generators use, e.g. in masks
+NAMED_COLORS = {"black": "#000000", "white": "#ffffff"}
+
+PATH_TOKEN = re.compile(r"[MLHVCAZmlhvcaz]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+PATH_ARGUMENTS = {"M": 2, "L": 2, "H": 1, "V": 1, "C": 6, "A": 7, "Z": 0}
+
+
+def arc_to(context, x1, y1, rx, ry, x_rotation, large_arc, sweep, x2, y2):
+    # An SVG elliptical arc from (x1, y1) to (x2, y2), converted to the center parameterization
+    # cairo uses (see the SVG spec's implementation notes).
+    if (x1, y1) == (x2, y2):
+        return
+    rx, ry = abs(rx), abs(ry)
+    if rx == 0 or ry == 0:
+        context.line_to(x2, y2)
+        return
+
+    phi = math.radians(x_rotation)
+    cos_phi, sin_phi = math.cos(phi), math.sin(phi)
+    dx, dy = (x1 - x2)/2, (y1 - y2)/2
+    x1p, y1p = cos_phi*dx + sin_phi*dy, -sin_phi*dx + cos_phi*dy
+
+    # radii too small to reach the end point are scaled up until they just do
+    scale = x1p**2/rx**2 + y1p**2/ry**2
+    if scale > 1:
+        rx, ry = rx*math.sqrt(scale), ry*math.sqrt(scale)
+
+    numerator = rx**2*ry**2 - rx**2*y1p**2 - ry**2*x1p**2
+    coefficient = math.sqrt(max(numerator, 0)/(rx**2*y1p**2 + ry**2*x1p**2))
+    if large_arc == sweep:
+        coefficient = -coefficient
+    cxp, cyp = coefficient*rx*y1p/ry, -coefficient*ry*x1p/rx
+    cx = cos_phi*cxp - sin_phi*cyp + (x1 + x2)/2
+    cy = sin_phi*cxp + cos_phi*cyp + (y1 + y2)/2
+
+    start = math.atan2((y1p - cyp)/ry, (x1p - cxp)/rx)
+    end = math.atan2((-y1p - cyp)/ry, (-x1p - cxp)/rx)
+
+    context.save()
+    context.translate(cx, cy)
+    context.rotate(phi)
+    context.scale(rx, ry)
+    if sweep:
+        context.arc(0, 0, 1, start, end)
+    else:
+        context.arc_negative(0, 0, 1, start, end)
+    context.restore()
+
+
+def trace_path(context, vertex_string):
+    # Adds SVG path data (the M, L, H, V, C, A and Z commands, absolute or relative) to the
+    # context's current path.
+    tokens = PATH_TOKEN.findall(vertex_string)
+    position = start = (0, 0)
+    i = 0
+    command = None
+    while i < len(tokens):
+        if tokens[i].isalpha():
+            command = tokens[i]
+            i += 1
+        elif command is None:
+            raise ValueError(f"Path data must start with a command: {vertex_string}")
+
+        name = command.upper()
+        count = PATH_ARGUMENTS[name]
+        if count == 0 and i < len(tokens) and not tokens[i].isalpha():
+            raise ValueError(f"Path data has numbers after {command}: {vertex_string}")
+        args = [float(token) for token in tokens[i:i + count]]
+        i += count
+        ox, oy = position if command.islower() else (0, 0)
+
+        if name == "M":
+            position = start = ox + args[0], oy + args[1]
+            context.move_to(*position)
+            # further coordinate pairs after a move are lines
+            command = "l" if command.islower() else "L"
+        elif name == "L":
+            position = ox + args[0], oy + args[1]
+            context.line_to(*position)
+        elif name == "H":
+            position = ox + args[0], position[1]
+            context.line_to(*position)
+        elif name == "V":
+            position = position[0], oy + args[0]
+            context.line_to(*position)
+        elif name == "C":
+            context.curve_to(ox + args[0], oy + args[1], ox + args[2], oy + args[3], ox + args[4], oy + args[5])
+            position = ox + args[4], oy + args[5]
+        elif name == "A":
+            end = ox + args[5], oy + args[6]
+            arc_to(context, *position, *args[:5], *end)
+            position = end
+        else:
+            context.close_path()
+            position = start
+
+
+class CairoCanvas:
+    # Draws the same primitives as the *_template functions in utils straight onto a cairo image
+    # surface, so a generator can produce pixels without writing SVG for cairosvg to parse. Colors
+    # are "#rrggbb" strings, as the templates take. utils.draw_scene draws scene graph nodes onto it.
+    def __init__(self, width, height, background_color=None):
+        self.width = width
+        self.height = height
+        self.surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+        self.context = cairo.Context(self.surface)
+        # SVG's default, where cairo's is 10
+        self.context.set_miter_limit(4)
+        if background_color:
+            self.rectangle(0, 0, width, height, background_color)
+
+    def set_color(self, color):
+        color = NAMED_COLORS.get(color, color)
+        self.context.set_source_rgb(*(channel/255 for channel in hex_to_rgb(color)))
+
+    @contextmanager
+    def transformed(self, translate=(0, 0), rotation=None):
+        # translates, then rotates by a utils.Rotation, for whatever is drawn inside the with block
+        self.context.save()
+        self.context.translate(*translate)
+        if rotation:
+            self.context.translate(rotation.cx, rotation.cy)
+            self.context.rotate(math.radians(rotation.degrees))
+            self.context.translate(-rotation.cx, -rotation.cy)
+        yield self
+        self.context.restore()
+
+    def paint_path(self, color=None, stroke=None, stroke_width=1):
+        if color:
+            self.set_color(color)
+            self.context.fill_preserve()
+        if stroke:
+            self.set_color(stroke)
+            self.context.set_line_width(stroke_width)
+            self.context.stroke_preserve()
+        self.context.new_path()
+
+    def path(self, vertex_string, color=None, stroke=None, stroke_width=1):
+        trace_path(self.context, vertex_string)
+        self.paint_path(color, stroke, stroke_width)
+
+    def rectangle(self, x, y, width, height, color=None, radius=0, rotation=None, stroke=None, stroke_width=1):
+        context = self.context
+        with self.transformed(rotation=rotation):
+            radius = min(radius, width/2, height/2)
+            if radius > 0:
+                context.new_sub_path()
+                context.arc(x + width - radius, y + radius, radius, -math.pi/2, 0)
+                context.arc(x + width - radius, y + height - radius, radius, 0, math.pi/2)
+                context.arc(x + radius, y + height - radius, radius, math.pi/2, math.pi)
+                context.arc(x + radius, y + radius, radius, math.pi, 3*math.pi/2)
+                context.close_path()
+            else:
+                context.rectangle(x, y, width, height)
+            self.paint_path(color, stroke, stroke_width)
+
+    def circle(self, cx, cy, radius, color=None, stroke=None, stroke_width=1):
+        self.context.new_sub_path()
+        self.context.arc(cx, cy, radius, 0, 2*math.pi)
+        self.paint_path(color, stroke, stroke_width)
+
+    @contextmanager
+    def masked(self, draw_mask):
+        # Whatever is drawn inside the with block is masked by what draw_mask(canvas) draws. cairo
+        # masks by alpha where SVG masks by luminance, so draw_mask should only draw the parts an SVG
+        # mask would draw in white.
+        self.context.push_group()
+        yield self
+        content = self.context.pop_group()
+
+        self.context.push_group()
+        draw_mask(self)
+        mask = self.context.pop_group()
+
+        self.context.set_source(content)
+        self.context.mask(mask)
+
+    def image(self):
+        return surface_to_image(self.surface)
+
+    def save(self, path):
+        self.surface.write_to_png(path)
@@ -0,0 +1,180 @@
+import math
+import os
+import struct
+import zlib
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+
+class GlyphCache:
+    # Rasterizes each (font, text, anchor) once into an "L" mask and blits that mask with the fill
+    # color wherever the text is drawn. Matches ImageDraw.text, including subpixel positioning.
+    def __init__(self):
+        self.masks = {}
+
+    def mask(self, font, text, anchor, start):
+        key = (font, text, anchor, start)
+        if key not in self.masks:
+            left, top, right, bottom = font.getbbox(text, anchor=anchor)
+            # one pixel of margin for the subpixel start
+            mask = Image.new("L", (right - left + 2, bottom - top + 2))
+            ImageDraw.Draw(mask).text(
+                (1 - left + start[0], 1 - top + start[1]),
+                text=text,
+                fill=255,
+                font=font,
+                anchor=anchor,
+            )
+            self.masks[key] = mask, (left - 1, top - 1)
+        return self.masks[key]
+
+    def draw(self, img, xy, text, fill, font, anchor="mm"):
+        x, y = xy
+        mask, (dx, dy) = self.mask(font, text, anchor, (math.modf(x)[0], math.modf(y)[0]))
+        left, top = int(x) + dx, int(y) + dy
+        box = left, top, left + mask.width, top + mask.height
+        img.paste(fill, box, mask)
+        return box
+
+
+PNG_COLOR_TYPES = {"L": 0, "RGB": 2, "RGBA": 6}
+
+
+class BandedPNGWriter:
+    # Encodes a PNG a horizontal band at a time, so that images far bigger than memory can be
+    # written as long as each band fits. Rows use the "Up" filter, which suits tiled artwork. The PNG
+    # is written next to path and only moved into place once it's complete.
+    def __init__(self, path, size, mode="RGB", compress_level=6):
+        self.path = path
+        self.partial_path = path + ".part"
+        self.width, self.height = size
+        self.mode = mode
+        self.rows_written = 0
+        self.previous_row = np.zeros((self.width, len(mode)), dtype=np.uint8)
+        self.compressor = zlib.compressobj(compress_level)
+
+        self.fh = open(self.partial_path, "wb")
+        self.fh.write(b"\x89PNG\r\n\x1a\n")
+        self.write_chunk(b"IHDR", struct.pack(">IIBBBBB", self.width, self.height, 8, PNG_COLOR_TYPES[mode], 0, 0, 0))
+
+    def write_chunk(self, chunk_type, data):
+        self.fh.write(struct.pack(">I", len(data)))
+        self.fh.write(chunk_type)
+        self.fh.write(data)
+        self.fh.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type))))
+
+    def write(self, band):
+        # band is a PIL image or a (rows, width[, channels]) uint8 array in this writer's mode
+        rows = np.asarray(band, dtype=np.uint8).reshape(-1, self.width, len(self.mode))
+        if self.rows_written + len(rows) > self.height:
+            raise ValueError(f"Band overflows image height {self.height}")
+
+        filtered = np.empty((len(rows), 1 + self.width*len(self.mode)), dtype=np.uint8)
+        filtered[:, 0] = 2
+        filtered[:1, 1:] = (rows[0] - self.previous_row).reshape(1, -1)
+        if len(rows) > 1:
+            filtered[1:, 1:] = (rows[1:] - rows[:-1]).reshape(len(rows) - 1, -1)
+
+        data = self.compressor.compress(filtered.tobytes())
+        if data:
+            self.write_chunk(b"IDAT", data)
+
+        self.previous_row = rows[-1].copy()
+        self.rows_written += len(rows)
+
+    def close(self):
+        if self.rows_written != self.height:
+            raise ValueError(f"Wrote {self.rows_written} of {self.height} rows")
+        self.write_chunk(b"IDAT", self.compressor.flush())
+        self.write_chunk(b"IEND", b"")
+        self.fh.close()
+        os.replace(self.partial_path, self.path)
+
+    def discard(self):
+        self.fh.close()
+        os.remove(self.partial_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+# Signed distances to simple shapes, evaluated over arrays of pixel-center coordinates: negative
+# inside, positive outside. Shapes combine with np.minimum (union) and np.maximum (intersection).
+
+def pixel_centers(size, extent):
+    # (x, y) grids of the pixel centers of a size x size raster covering an extent x extent area,
+    # and the width of one pixel in the same units
+    pixel = extent/size
+    centers = (np.arange(size) + .5)*pixel
+    x, y = np.meshgrid(centers, centers)
+    return x, y, pixel
+
+
+def coverage(distance, pixel):
+    # anti-aliased coverage, ramping across one pixel at the edge
+    return np.clip(.5 - distance/pixel, 0, 1)
+
+
+def circle_distance(x, y, cx, cy, radius):
+    return np.hypot(x - cx, y - cy) - radius
+
+
+def rounded_rect_distance(x, y, left, top, width, height, radius=0):
+    qx = np.abs(x - (left + width/2)) - width/2 + radius
+    qy = np.abs(y - (top + height/2)) - height/2 + radius
+    return np.hypot(np.maximum(qx, 0), np.maximum(qy, 0)) + np.minimum(np.maximum(qx, qy), 0) - radius
+
+
+def half_plane_distance(x, y, px, py, nx, ny):
+    # the half plane on the (nx, ny) side of the line through (px, py), for a unit vector (nx, ny)
+    return (px - x)*nx + (py - y)*ny
+
+
+def polygon_distance(x, y, vertices):
+    # distance to the nearest edge, signed by the even-odd rule
+    distance = np.full(np.shape(x), np.inf)
+    inside = np.zeros(np.shape(x), dtype=bool)
+    for (x1, y1), (x2, y2) in zip(vertices, vertices[1:] + vertices[:1]):
+        ex, ey = x2 - x1, y2 - y1
+        t = np.clip(((x - x1)*ex + (y - y1)*ey)/(ex*ex + ey*ey), 0, 1)
+        distance = np.minimum(distance, np.hypot(x - x1 - t*ex, y - y1 - t*ey))
+        crosses = (y1 > y) != (y2 > y)
+        inside ^= crosses & (x < x1 + (y - y1)*ex/np.where(ey == 0, 1, ey))
+    return np.where(inside, -distance, distance)
+
+
+def crescent_distance(x, y, cx, cy, radius, rotation, percent):
+    # the shape traced by utils.crescent_moon_path: the lit half of the disk facing away from
+    # rotation, bounded on the other side by a circular arc through the ends of the diameter
+    if percent == 0:
+        return np.full(np.shape(x), np.inf)
+    disk = circle_distance(x, y, cx, cy, radius)
+    if percent == 1:
+        return disk
+
+    nx, ny = -math.cos(rotation), -math.sin(rotation)
+    lit_half = np.maximum(disk, half_plane_distance(x, y, cx, cy, nx, ny))
+    if percent == .5:
+        return lit_half
+
+    # the terminator crosses the axis at depth*radius from the center
+    depth = abs(1 - 2*percent)
+    inner_radius = radius*(depth**2 + 1)/(2*depth)
+    if percent < .5:
+        offset = radius*depth - inner_radius
+        return np.maximum(lit_half, -circle_distance(x, y, cx + offset*nx, cy + offset*ny, inner_radius))
+    offset = inner_radius - radius*depth
+    return np.maximum(disk, np.minimum(lit_half, circle_distance(x, y, cx + offset*nx, cy + offset*ny, inner_radius)))
+
+
+def composite(images, alpha, colors):
+    # paints (n, 3) colors over a float (n, height, width, 3) stack of images with (n or 1, height,
+    # width) coverage
+    images += (np.asarray(colors, dtype=images.dtype)[:, None, None, :] - images)*alpha[..., None]
@@ -2,9 +2,15 @@ import os
 from dataclasses import dataclass
 from typing import Callable
 
+import numpy as np
+from PIL import Image
+from tqdm import tqdm
+
+from raster_utils import circle_distance, composite, coverage, crescent_distance, pixel_centers, polygon_distance, rounded_rect_distance
 from utils import *
 
 CARDS_DIR = "images/season_cards"
+CARD_PNGS_DIR = "pngs/season_cards"
 
 
 class Season(Enum):
@@ -28,41 +34,62 @@ SEASON_COLORS: dict[Season, Color] = {
 LIGHT_COLORS = (Color.CREAM, Color.SPRING_GREEN, Color.SUMMER_GOLD)
 
 
-def earth_path(cx, cy, radius, color):
+def earth_dimensions(radius):
     factor = (math.sqrt(2)-1)/(3*math.sqrt(2))
     inner_radius = radius*(1-2*factor)
     avg_radius = (radius+inner_radius)/2
     line_thickness = radius*factor
 
-    return f"""
-    <circle cx="{cx}" cy="{cy}" r="{avg_radius}" stroke="{color.value}" stroke-width="{radius - inner_radius}" fill="none"/>
-    {rectangle_template(cx - line_thickness, cy - avg_radius, 2*line_thickness, 2*avg_radius, color.value)}
-    {rectangle_template(cx - avg_radius, cy - line_thickness, 2*avg_radius, 2*line_thickness, color.value)}
-    """
+    return inner_radius, avg_radius, line_thickness
+
+
+def earth_nodes(cx, cy, radius, color):
+    inner_radius, avg_radius, line_thickness = earth_dimensions(radius)
+
+    return [
+        Circle(cx, cy, avg_radius, stroke=color.value, stroke_width=radius - inner_radius),
+        Rect(cx - line_thickness, cy - avg_radius, 2*line_thickness, 2*avg_radius, fill=color.value),
+        Rect(cx - avg_radius, cy - line_thickness, 2*avg_radius, 2*line_thickness, fill=color.value),
+    ]
+
+
+def earth_path(cx, cy, radius, color):
+    return nodes_template(earth_nodes(cx, cy, radius, color))
+
+
+def moon_nodes(cx, cy, radius, color):
+    return crescent_moon_nodes(cx + .2*radius, cy - .2*radius, radius, color.value, -math.pi/4, .25)
 
 
 def moon_path(cx, cy, radius, color):
-    return crescent_moon_template(cx + .2*radius, cy - .2*radius, radius, color.value, -math.pi/4, .25)
+    return nodes_template(moon_nodes(cx, cy, radius, color))
 
 
 SUN_VALLEY = .625
 
 
-def sun_path(cx, cy, radius, color):
-    return path_template(
-        polygon_path(
-            star_vertices(
-                points=8,
-                center=(cx, cy),
-                peak_radius=radius,
-                valley_radius=radius*SUN_VALLEY,
-                askew=math.pi/8,
-            )
-        ),
-        color=color.value,
+def sun_corners(cx, cy, radius):
+    return star_vertices(
+        points=8,
+        center=(cx, cy),
+        peak_radius=radius,
+        valley_radius=radius*SUN_VALLEY,
+        askew=math.pi/8,
     )
 
 
+def sun_polygon(cx, cy, radius):
+    return polygon_path(sun_corners(cx, cy, radius))
+
+
+def sun_nodes(cx, cy, radius, color):
+    return [Path(sun_polygon(cx, cy, radius), fill=color.value)]
+
+
+def sun_path(cx, cy, radius, color):
+    return nodes_template(sun_nodes(cx, cy, radius, color))
+
+
 def sun_area(radius):
     width = 2*radius*math.cos(math.pi/8)
     square_area = width*width
@@ -82,21 +109,28 @@ def sun_area(radius):
 STAR_VALLEY = .4
 
 
-def star_path(cx, cy, radius, color):
-    return path_template(
-        polygon_path(
-            star_vertices(
-                points=4,
-                center=(cx, cy),
-                peak_radius=radius,
-                valley_radius=radius * STAR_VALLEY,
-                askew=0,
-            )
-        ),
-        color=color.value,
+def star_corners(cx, cy, radius):
+    return star_vertices(
+        points=4,
+        center=(cx, cy),
+        peak_radius=radius,
+        valley_radius=radius * STAR_VALLEY,
+        askew=0,
     )
 
 
+def star_polygon(cx, cy, radius):
+    return polygon_path(star_corners(cx, cy, radius))
+
+
+def star_nodes(cx, cy, radius, color):
+    return [Path(star_polygon(cx, cy, radius), fill=color.value)]
+
+
+def star_path(cx, cy, radius, color):
+    return nodes_template(star_nodes(cx, cy, radius, color))
+
+
 def star_area(radius):
     width = radius*math.sqrt(2)
     diamond_area = width*width
@@ -113,6 +147,46 @@ SHAPES = {
     "earth": earth_path,
 }
 
+
+# the same shapes as scene graph nodes, which can be written as SVG or drawn onto a CairoCanvas
+SHAPE_NODES = {
+    "sun": sun_nodes,
+    "moon": moon_nodes,
+    "star": star_nodes,
+    "earth": earth_nodes,
+}
+
+
+# and as signed distance fields, for rendering proofs with NumPy
+
+def earth_distance(x, y, cx, cy, radius):
+    inner_radius, avg_radius, line_thickness = earth_dimensions(radius)
+    return np.minimum.reduce([
+        np.abs(circle_distance(x, y, cx, cy, avg_radius)) - (radius - inner_radius)/2,
+        rounded_rect_distance(x, y, cx - line_thickness, cy - avg_radius, 2*line_thickness, 2*avg_radius),
+        rounded_rect_distance(x, y, cx - avg_radius, cy - line_thickness, 2*avg_radius, 2*line_thickness),
+    ])
+
+
+def moon_distance(x, y, cx, cy, radius):
+    return crescent_distance(x, y, cx + .2*radius, cy - .2*radius, radius, -math.pi/4, .25)
+
+
+def sun_distance(x, y, cx, cy, radius):
+    return polygon_distance(x, y, sun_corners(cx, cy, radius))
+
+
+def star_distance(x, y, cx, cy, radius):
+    return polygon_distance(x, y, star_corners(cx, cy, radius))
+
+
+SHAPE_DISTANCES = {
+    "sun": sun_distance,
+    "moon": moon_distance,
+    "star": star_distance,
+    "earth": earth_distance,
+}
+
 EM = 50  # 15
 SIDE_LENGTH = 48 * EM
 BORDER_WIDTH = 4 * EM
@@ -170,9 +244,16 @@ NUMBERS = [
 ]
 
 
+WATERMARK_STROKE_WIDTH = .2*EM
+
+
+def watermark_node(vertex_string, color):
+    return Path(vertex_string, stroke=color, stroke_width=WATERMARK_STROKE_WIDTH, mask="bodymask")
+
+
 @dataclass
 class SeasonWatermark:
-    curves: Callable[[int, int, str], list[str]]
+    curves: Callable[[int, int], list[str]]
     width: int
     height: int
 
@@ -181,145 +262,188 @@ WATERMARKS: dict[Season, SeasonWatermark] = {
     Season.SPRING: SeasonWatermark(
         # See comment in tessellating_clover_paths. There's some constraint that I failed to figure out, so I
         # arrived at these numbers by some trial and error.
-        curves=lambda x, y, color: [
-            f'<path d="{path}" stroke="{color}" stroke-width="{.2*EM}" fill="none" mask="url(#bodymask)"/>'
-            for path in tessellating_clover_paths(x, y, math.pi * .6, math.pi * .1205, 2.4*EM, 1.2*EM)
-        ] + [
-            f'<path d="{path}" stroke="{color}" stroke-width="{.2*EM}" fill="none" mask="url(#bodymask)"/>'
-            for path in tessellating_clover_paths(x + 3*EM, y + 1.75*EM, math.pi * .6, math.pi * .1205, 2.4*EM, 1.2*EM)
-        ],
+        curves=lambda x, y: (
+            tessellating_clover_paths(x, y, math.pi * .6, math.pi * .1205, 2.4*EM, 1.2*EM)
+            + tessellating_clover_paths(x + 3*EM, y + 1.75*EM, math.pi * .6, math.pi * .1205, 2.4*EM, 1.2*EM)
+        ),
         width=round(6*EM),
         height=round(3.5*EM),
     ),
     Season.SUMMER: SeasonWatermark(
-        curves=lambda x, y, color: [
-            f'<path d="{hexagon_path(x, y, 1.2*EM)}" stroke="{color}" stroke-width="{.2*EM}" fill="none" mask="url(#bodymask)"/>',
-            f'<path d="{hexagon_path(x + 1.8*EM, y + .6*EM*math.sqrt(3), 1.2*EM)}" stroke="{color}" stroke-width="{.2*EM}" fill="none" mask="url(#bodymask)"/>',
+        curves=lambda x, y: [
+            hexagon_path(x, y, 1.2*EM),
+            hexagon_path(x + 1.8*EM, y + .6*EM*math.sqrt(3), 1.2*EM),
         ],
         width=round(3.6*EM),
         height=round(1.2*EM*math.sqrt(3)),
     ),
     Season.AUTUMN: SeasonWatermark(
-        curves=lambda x, y, color: [
-            f'<path d="{path}" stroke="{color}" stroke-width="{.2*EM}" fill="none" mask="url(#bodymask)"/>'
-            for path in (
-                leaf_paths(x, y, 4*EM)
-                + leaf_paths(x + 6*EM, y + 2*EM*math.sqrt(3), 4*EM)
-            )
-        ],
+        curves=lambda x, y: (
+            leaf_paths(x, y, 4*EM)
+            + leaf_paths(x + 6*EM, y + 2*EM*math.sqrt(3), 4*EM)
+        ),
         width=round(12*EM),
         height=round(4*EM*math.sqrt(3)),
     ),
     Season.WINTER: SeasonWatermark(
-        curves=lambda x, y, color: [
-            f'<path d="M{x} {y}A{.8*EM} {.8*EM} 0 0 0 {x+EM} {y} {.8*EM} {.8*EM} 0 0 1 {x+2*EM} {y} {.8*EM} {.8*EM} 0 0 0 {x+EM} {y} {.8*EM} {.8*EM} 0 0 1 {x} {y}" stroke="{color}" stroke-width="{.2*EM}" fill="none" mask="url(#bodymask)"/>',
-            f'<path d="M{x+EM} {y+1.6*EM}A{.8*EM} {.8*EM} 0 0 0 {x+2*EM} {y+1.6*EM} {.8*EM} {.8*EM} 0 0 1 {x+3*EM} {y+1.6*EM} {.8*EM} {.8*EM} 0 0 0 {x+2*EM} {y+1.6*EM} {.8*EM} {.8*EM} 0 0 1 {x+EM} {y+1.6*EM} " stroke="{color}" stroke-width="{.2*EM}" fill="none" mask="url(#bodymask)"/>',
+        curves=lambda x, y: [
+            f'M{x} {y}A{.8*EM} {.8*EM} 0 0 0 {x+EM} {y} {.8*EM} {.8*EM} 0 0 1 {x+2*EM} {y} {.8*EM} {.8*EM} 0 0 0 {x+EM} {y} {.8*EM} {.8*EM} 0 0 1 {x} {y}',
+            f'M{x+EM} {y+1.6*EM}A{.8*EM} {.8*EM} 0 0 0 {x+2*EM} {y+1.6*EM} {.8*EM} {.8*EM} 0 0 1 {x+3*EM} {y+1.6*EM} {.8*EM} {.8*EM} 0 0 0 {x+2*EM} {y+1.6*EM} {.8*EM} {.8*EM} 0 0 1 {x+EM} {y+1.6*EM} ',
         ],
         width=round(2*EM),
         height=round(3.2*EM),
     ),
     Season.AIR: SeasonWatermark(
-        curves=lambda x, y, color: [
-            f'<path d="{uniform_spiral_path(x, y, 1.8*EM, i*math.pi, 2.5*math.pi, .1*EM, 10)}" stroke="{color}" stroke-width="{.2*EM}" fill="none" mask="url(#bodymask)"/>'
+        curves=lambda x, y: [
+            uniform_spiral_path(x, y, 1.8*EM, i*math.pi, 2.5*math.pi, .1*EM, 10)
             for i in range(2)
         ] + [
-            f'<path d="{uniform_spiral_path(x + 1.8*EM, y + 1.8*EM*math.sqrt(3), 1.8*EM, i*math.pi, 2.5*math.pi, .1*EM, 10)}" stroke="{color}" stroke-width="{.2*EM}" fill="none" mask="url(#bodymask)"/>'
+            uniform_spiral_path(x + 1.8*EM, y + 1.8*EM*math.sqrt(3), 1.8*EM, i*math.pi, 2.5*math.pi, .1*EM, 10)
             for i in range(2)
         ],
         width=round(3.6*EM),
         height=round(3.6*EM*math.sqrt(3))
     ),
     Season.EARTH: SeasonWatermark(
-        curves=lambda x, y, color: [
-            f'<path d="{path}" stroke="{color}" stroke-width="{.2*EM}" fill="none" mask="url(#bodymask)"/>'
-            for path in (
-                cube_paths(x, y, 2*EM)
-                + cube_paths(x + 1*EM*math.sqrt(3), y + 3*EM, 2*EM)
-            )
-        ],
+        curves=lambda x, y: (
+            cube_paths(x, y, 2*EM)
+            + cube_paths(x + 1*EM*math.sqrt(3), y + 3*EM, 2*EM)
+        ),
         width=round(2*EM*math.sqrt(3)),
         height=round(6*EM),
     ),
 }
 
 
-def make_season_cards():
-    os.makedirs("images/season_cards", exist_ok=True)
-
+def season_card_faces():
+    # (file name without extension, season, shape name, number) for each card, in deck order
     i = 0
     for season in Season:
-        season_color = SEASON_COLORS[season]
-        contrast_color = Color.BLACK if season_color in LIGHT_COLORS else Color.CREAM
-
-        for shape_name, shape_function in SHAPES.items():
+        for shape_name in SHAPES:
             for number_info in NUMBERS:
-                count = len(number_info.centers)
-
                 i += 1
-                file_name = f"{i:03d}_{season.value}_{count}_{shape_name}s.svg"
-                filepath = f"{CARDS_DIR}/{file_name}"
+                yield f"{i:03d}_{season.value}_{len(number_info.centers)}_{shape_name}s", season, shape_name, number_info
 
-                paths = []
-                paths.append(
-                    rectangle_template(
-                        0, 0, SIDE_LENGTH, SIDE_LENGTH,
-                        radius=0,
-                        color=contrast_color.value,
-                    )
-                )
-                paths.append(
-                    rectangle_template(
-                        BORDER_WIDTH,
-                        BORDER_WIDTH,
-                        SIDE_LENGTH - 2*BORDER_WIDTH,
-                        SIDE_LENGTH - 2*BORDER_WIDTH,
-                        radius=CORNER_RADIUS,
-                        color=season_color.value,
-                    )
+
+def card_colors(season):
+    season_color = SEASON_COLORS[season]
+    contrast_color = Color.BLACK if season_color in LIGHT_COLORS else Color.CREAM
+    return season_color, contrast_color
+
+
+def season_card_nodes(season, shape_name, number_info):
+    # one card face as scene graph nodes, written to SVG by make_season_cards and drawn straight
+    # onto a CairoCanvas by make_season_card_pngs
+    season_color, contrast_color = card_colors(season)
+
+    nodes = [
+        Rect(0, 0, SIDE_LENGTH, SIDE_LENGTH, fill=contrast_color.value),
+        Rect(
+            BORDER_WIDTH,
+            BORDER_WIDTH,
+            SIDE_LENGTH - 2*BORDER_WIDTH,
+            SIDE_LENGTH - 2*BORDER_WIDTH,
+            fill=season_color.value,
+            radius=CORNER_RADIUS,
+        ),
+    ]
+
+    if season in WATERMARKS:
+        nodes.append(Mask("bodymask", [
+            Rect(0, 0, SIDE_LENGTH, SIDE_LENGTH, fill="black"),
+            Rect(
+                BORDER_WIDTH,
+                BORDER_WIDTH,
+                SIDE_LENGTH - 2*BORDER_WIDTH,
+                SIDE_LENGTH - 2*BORDER_WIDTH,
+                fill="white",
+                radius=CORNER_RADIUS,
+            ),
+        ]))
+
+        watermark = WATERMARKS[season]
+        watermark_color = mix_hex_colors(contrast_color.value, season_color.value, WATERMARK_SATURATION[season])
+        for x in range(0, SIDE_LENGTH, watermark.width):
+            for y in range(0, SIDE_LENGTH, watermark.height):
+                nodes += [watermark_node(curve, watermark_color) for curve in watermark.curves(x, y)]
+
+    for cx, cy in number_info.centers:
+        nodes += SHAPE_NODES[shape_name](cx, cy, number_info.radius, contrast_color)
+
+    return nodes
+
+
+def make_season_cards():
+    os.makedirs(CARDS_DIR, exist_ok=True)
+
+    for name, season, shape_name, number_info in season_card_faces():
+        with open(f"{CARDS_DIR}/{name}.svg", "w") as fh:
+            fh.write(
+                svg_template(
+                    SIDE_LENGTH,
+                    SIDE_LENGTH,
+                    season_card_nodes(season, shape_name, number_info),
                 )
+            )
 
-                if season in WATERMARKS:
-                    mask = f"""
-                        <mask id="bodymask">
-                            {rectangle_template(
-                                0,
-                                0,
-                                SIDE_LENGTH,
-                                SIDE_LENGTH,
-                                radius=0,
-                                color="black",
-                            )}
-                            {rectangle_template(
-                                BORDER_WIDTH,
-                                BORDER_WIDTH,
-                                SIDE_LENGTH - 2*BORDER_WIDTH,
-                                SIDE_LENGTH - 2*BORDER_WIDTH,
-                                radius=CORNER_RADIUS,
-                                color="white",
-                            )}
-                        </mask>
-                    """
-                    paths.append(mask)
-
-                    watermark = WATERMARKS[season]
-                    watermark_color = mix_hex_colors(contrast_color.value, season_color.value, WATERMARK_SATURATION[season])
-                    for x in range(0, SIDE_LENGTH, watermark.width):
-                        for y in range(0, SIDE_LENGTH, watermark.height):
-                            paths += watermark.curves(x, y, watermark_color)
 
-                for cx, cy in number_info.centers:
-                    paths.append(
-                        shape_function(cx, cy, number_info.radius, contrast_color)
-                    )
+def make_season_card_pngs():
+    # Renders the deck straight to PNG, without writing or parsing any SVG. cairo is only imported
+    # here, so writing the SVGs doesn't need libcairo.
+    from cairo_utils import CairoCanvas
 
-                with open(filepath, "w") as fh:
-                    fh.write(
-                        svg_template(
-                            SIDE_LENGTH,
-                            SIDE_LENGTH,
-                            paths,
-                        )
-                    )
+    os.makedirs(CARD_PNGS_DIR, exist_ok=True)
+
+    for name, season, shape_name, number_info in tqdm(list(season_card_faces())):
+        canvas = CairoCanvas(SIDE_LENGTH, SIDE_LENGTH)
+        draw_scene(canvas, season_card_nodes(season, shape_name, number_info))
+        canvas.save(f"{CARD_PNGS_DIR}/{name}.png")
+
+
+def season_card_proofs(size=120):
+    # Renders every card face at size x size pixels in one batch, as a (cards, size, size, 3) uint8
+    # array, for proofs and thumbnails. Watermarks are left out. The coverage of each distinct
+    # layer is only evaluated once and composited onto all the cards that use it.
+    faces = list(season_card_faces())
+    x, y, pixel = pixel_centers(size, SIDE_LENGTH)
+
+    season_colors = [hex_to_rgb(card_colors(season)[0].value) for _, season, _, _ in faces]
+    contrast_colors = [hex_to_rgb(card_colors(season)[1].value) for _, season, _, _ in faces]
+
+    proofs = np.empty((len(faces), size, size, 3), dtype=np.float32)
+    proofs[:] = np.array(contrast_colors, dtype=np.float32)[:, None, None, :]
+
+    body = rounded_rect_distance(
+        x, y, BORDER_WIDTH, BORDER_WIDTH, SIDE_LENGTH - 2*BORDER_WIDTH, SIDE_LENGTH - 2*BORDER_WIDTH, CORNER_RADIUS
+    )
+    composite(proofs, coverage(body, pixel)[None], season_colors)
+
+    # one layer per (shape, number), shared by the six seasons
+    layers = {}
+    for _, _, shape_name, number_info in faces:
+        key = shape_name, len(number_info.centers)
+        if key not in layers:
+            layers[key] = coverage(np.minimum.reduce([
+                SHAPE_DISTANCES[shape_name](x, y, cx, cy, number_info.radius)
+                for cx, cy in number_info.centers
+            ]), pixel)
+    keys = list(layers)
+    layer_index = [keys.index((shape_name, len(number_info.centers))) for _, _, shape_name, number_info in faces]
+    composite(proofs, np.stack([layers[key] for key in keys])[layer_index], contrast_colors)
+
+    return np.rint(proofs).astype(np.uint8)
+
+
+def make_season_card_proofs(size=120, columns=12):
+    # all the cards on one contact sheet, in deck order
+    proofs = season_card_proofs(size)
+    rows = -(-len(proofs)//columns)
+    sheet = np.zeros((rows*columns, size, size, 3), dtype=np.uint8)
+    sheet[:len(proofs)] = proofs
+    sheet = sheet.reshape(rows, columns, size, size, 3).transpose(0, 2, 1, 3, 4).reshape(rows*size, columns*size, 3)
+
+    os.makedirs(CARD_PNGS_DIR, exist_ok=True)
+    Image.fromarray(sheet).save(f"{CARD_PNGS_DIR}/proofs.png")
 
 
 def make_blank_cards():
@@ -368,7 +492,7 @@ def make_blank_cards():
             watermark_color = mix_hex_colors(contrast_color.value, SEASON_COLORS[season].value, WATERMARK_SATURATION[season])
             for x in range(-watermark.width, SIDE_LENGTH*3 + watermark.width, watermark.width):
                 for y in range(-watermark.height, SIDE_LENGTH*3 + watermark.height, watermark.height):
-                    paths += watermark.curves(x, y, watermark_color)
+                    paths += [watermark_node(curve, watermark_color) for curve in watermark.curves(x, y)]
 
         with open(filepath, "w") as fh:
             fh.write(
@@ -522,7 +646,7 @@ def make_back():
         )
 
 
-def solar_system_paths(cx, cy, star_distance):
+def solar_system_nodes(cx, cy, star_distance):
     standard_unit = star_distance/.72
 
     sun_radius = standard_unit * 7.5 * EM
@@ -540,36 +664,30 @@ def solar_system_paths(cx, cy, star_distance):
     one_star_area = color_area/(4*len(star_points))
     star_radius = (one_star_area/star_area(1))**.5
 
-    paths = []
-
-    paths.append(
-        sun_path(cx, cy, sun_radius, Color.AUTUMN_RED)
-    )
+    nodes = sun_nodes(cx, cy, sun_radius, Color.AUTUMN_RED)
 
     for i in range(4):
         earth_angle = i*math.pi/2 + math.pi/4
         earth_cx, earth_cy = cx + earth_orbit*math.cos(earth_angle), cy + earth_orbit*math.sin(earth_angle)
 
-        paths.append(
-            circle_template(earth_cx, earth_cy, earth_radius-.1*EM, Color.SPRING_GREEN.value)
-        )
-        paths.append(
-            earth_path(earth_cx, earth_cy, earth_radius, Color.WINTER_BLUE)
+        nodes.append(
+            Circle(earth_cx, earth_cy, earth_radius-.1*EM, fill=Color.SPRING_GREEN.value)
         )
+        nodes += earth_nodes(earth_cx, earth_cy, earth_radius, Color.WINTER_BLUE)
 
         for j in range(8):
             moon_angle = earth_angle + j*math.pi/4
             moon_cx, moon_cy = earth_cx + moon_orbit*math.cos(moon_angle), earth_cy + moon_orbit*math.sin(moon_angle)
             moon_fullness = abs(1 - j/4)
-            paths.append(crescent_moon_template(moon_cx, moon_cy, moon_radius, Color.CREAM.value, earth_angle, moon_fullness))
+            nodes += crescent_moon_nodes(moon_cx, moon_cy, moon_radius, Color.CREAM.value, earth_angle, moon_fullness)
 
         star_angle = i*math.pi/2
         ex, ey = cx + SIDE_LENGTH/2*math.cos(star_angle), cy + SIDE_LENGTH/2*math.sin(star_angle)
         basis = CustomBasis(cx, cy, ex, ey)
         for point in star_points:
-            paths.append(star_path(*basis.convert(*point), star_radius, Color.SUMMER_GOLD))
+            nodes += star_nodes(*basis.convert(*point), star_radius, Color.SUMMER_GOLD)
 
-    return paths
+    return nodes
 
 
 def make_solar_system_back():
@@ -586,7 +704,7 @@ def make_solar_system_back():
             color=Color.BLACK.value,
         )
     )
-    paths += solar_system_paths(cx, cy, star_distance)
+    paths += solar_system_nodes(cx, cy, star_distance)
 
     with open(filepath, "w") as fh:
         fh.write(
@@ -602,6 +720,8 @@ if __name__ == "__main__":
     for file in os.listdir(CARDS_DIR):
         os.remove(os.path.join(CARDS_DIR, file))
     make_season_cards()
+    make_season_card_pngs()
+    make_season_card_proofs()
     make_blank_cards()
     make_back()
     make_solar_system_back()
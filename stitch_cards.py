@@ -1,39 +1,144 @@
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 from tqdm import tqdm
 
-from season_cards import SIDE_LENGTH
+from raster_utils import BandedPNGWriter
+from season_cards import CARDS_DIR, SIDE_LENGTH
 
-WIDTH = 10
-HEIGHT = 6
+COLUMNS = 10
+ROWS = 6
 PNG_DIR = 'pngs/season_cards/'
+PDF_PATH = os.path.join(PNG_DIR, "stitched_deck.pdf")
+SOLAR_SYSTEM_PDF_PATH = os.path.join(PNG_DIR, "stitched_deck_solar_system.pdf")
+BACK_PATH = os.path.join(CARDS_DIR, "back.svg")
+SOLAR_SYSTEM_BACK_PATH = os.path.join(CARDS_DIR, "solar_system_back.svg")
+# card pixels per printed inch, so a 2400 px card prints 4 inches wide
+PRINT_DPI = 600
+# the largest page a PDF can hold, in points
+MAX_PDF_PAGE = 14400
 
-card_fronts = sorted([
-    filename
-    for filename in os.listdir(PNG_DIR)
-    if re.match(r"\d{3}", filename)
-])
-
-stitched_image = Image.new(
-    mode="RGB",
-    size=(WIDTH*SIDE_LENGTH, HEIGHT*SIDE_LENGTH),
-)
-
-for suffix, offset in [('_1', 0), ('_2', 60)]:
-    for i in tqdm(range(WIDTH)):
-        for j in range(HEIGHT):
-            card_filename = card_fronts[offset + i + WIDTH*j]
-            card_image = Image.open(os.path.join(PNG_DIR, card_filename))
-
-            left = i * SIDE_LENGTH
-            top = j * SIDE_LENGTH
-
-            for x in range(SIDE_LENGTH):
-                for y in range(SIDE_LENGTH):
-                    stitched_image.putpixel(
-                        (left+x, top+y),
-                        card_image.getpixel((x, y))
-                    )
-    
-    stitched_image.save(os.path.join(PNG_DIR, f"stitched_fronts{suffix}.png"))
+
+def card_fronts(png_dir=PNG_DIR):
+    return sorted(
+        os.path.join(png_dir, filename)
+        for filename in os.listdir(png_dir)
+        if re.match(r"\d{3}", filename)
+    )
+
+
+def load_card(path):
+    # only the color is stitched; any alpha channel is dropped
+    with Image.open(path) as card_image:
+        return card_image.convert("RGB")
+
+
+def card_positions(columns, rows, card_size=SIDE_LENGTH, margin=0, gutter=0, order="rows"):
+    # top left corner of each slot on a sheet, filling rows first ("rows") or columns first ("columns")
+    if order == "rows":
+        slots = [(i, j) for j in range(rows) for i in range(columns)]
+    elif order == "columns":
+        slots = [(i, j) for i in range(columns) for j in range(rows)]
+    else:
+        raise ValueError(f"Unknown order {order}")
+
+    return [(margin + i*(card_size + gutter), margin + j*(card_size + gutter)) for i, j in slots]
+
+
+def sheet_size(columns, rows, card_size=SIDE_LENGTH, margin=0, gutter=0):
+    return (
+        2*margin + columns*card_size + (columns - 1)*gutter,
+        2*margin + rows*card_size + (rows - 1)*gutter,
+    )
+
+
+def sheet_bands(paths, columns=COLUMNS, rows=ROWS, card_size=SIDE_LENGTH, margin=0, gutter=0, order="rows",
+                background="black", workers=8):
+    # Lays out one sheet of up to columns*rows cards as horizontal bands, one per row of cards,
+    # yielding (top, band) pairs. Each band runs down to the next row of cards, and the last one to
+    # the bottom of the sheet. A row's cards are decoded in a thread pool (PIL releases the GIL
+    # while decoding) and pasted into their slots.
+    width, height = sheet_size(columns, rows, card_size, margin, gutter)
+    positions = card_positions(columns, rows, card_size, margin, gutter, order)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        band_top = 0
+        for j in tqdm(range(rows)):
+            top = margin + j*(card_size + gutter)
+            band_bottom = top + card_size + gutter if j < rows - 1 else height
+            band = Image.new(mode="RGB", size=(width, band_bottom - band_top), color=background)
+
+            row = [(card_path, (left, card_top)) for card_path, (left, card_top) in zip(paths, positions) if card_top == top]
+            for card_image, (_, (left, card_top)) in zip(pool.map(load_card, [card_path for card_path, _ in row]), row):
+                band.paste(card_image, (left, card_top - band_top))
+
+            yield band_top, band
+            band_top = band_bottom
+
+
+def impose(paths, columns=COLUMNS, rows=ROWS, card_size=SIDE_LENGTH, margin=0, gutter=0, **layout):
+    # the whole sheet as one image
+    stitched_image = Image.new(mode="RGB", size=sheet_size(columns, rows, card_size, margin, gutter))
+    for top, band in sheet_bands(paths, columns, rows, card_size, margin, gutter, **layout):
+        stitched_image.paste(band, (0, top))
+    return stitched_image
+
+
+def write_sheet(paths, path, columns=COLUMNS, rows=ROWS, card_size=SIDE_LENGTH, margin=0, gutter=0, **layout):
+    # Like impose, but streams the sheet into a PNG a band at a time, so only one row of cards and a
+    # band the width of the sheet are ever in memory, however big the sheet is.
+    with BandedPNGWriter(path, sheet_size(columns, rows, card_size, margin, gutter)) as writer:
+        for _, band in sheet_bands(paths, columns, rows, card_size, margin, gutter, **layout):
+            writer.write(band)
+
+
+def write_pdf(paths, path=PDF_PATH, back_path=BACK_PATH, columns=COLUMNS, rows=ROWS, card_size=SIDE_LENGTH, margin=0,
+              gutter=0, order="rows", dpi=PRINT_DPI):
+    # Imposes card SVGs straight onto PDF pages as vectors, nothing is rasterized. Each sheet of
+    # fronts is followed by a page of backs, mirrored left to right so they line up when printed
+    # duplex on the long edge. Layout is in card pixels, printed at dpi pixels per inch.
+    # cairo is only imported here, so the raster sheets don't need libcairo.
+    import cairocffi as cairo
+    from cairosvg.parser import Tree
+
+    from cairo_utils import PlacedSurface
+
+    width, height = sheet_size(columns, rows, card_size, margin, gutter)
+    positions = card_positions(columns, rows, card_size, margin, gutter, order)
+    with open(back_path, "rb") as fh:
+        back = fh.read()
+
+    points_per_pixel = 72/dpi
+    page_size = width*points_per_pixel, height*points_per_pixel
+    if max(page_size) > MAX_PDF_PAGE:
+        raise ValueError(f"{page_size[0]:.0f}x{page_size[1]:.0f} pt pages are too big for a PDF, raise dpi")
+    surface = cairo.PDFSurface(path, *page_size)
+
+    per_sheet = columns*rows
+    for start in tqdm(range(0, len(paths), per_sheet)):
+        sheet_paths = paths[start:start + per_sheet]
+
+        for card_path, position in zip(sheet_paths, positions):
+            PlacedSurface(Tree(url=card_path), surface, position, dpi)
+        surface.show_page()
+
+        for left, top in positions[:len(sheet_paths)]:
+            PlacedSurface(Tree(bytestring=back), surface, (width - left - card_size, top), dpi)
+        surface.show_page()
+
+    surface.finish()
+
+
+def stitch_sheets(paths, png_dir=PNG_DIR, columns=COLUMNS, rows=ROWS, **layout):
+    # one sheet per columns*rows cards, saved as stitched_fronts_1.png, stitched_fronts_2.png, ...
+    per_sheet = columns*rows
+    for sheet, start in enumerate(range(0, len(paths), per_sheet)):
+        sheet_path = os.path.join(png_dir, f"stitched_fronts_{sheet + 1}.png")
+        write_sheet(paths[start:start + per_sheet], sheet_path, columns, rows, **layout)
+
+
+if __name__ == "__main__":
+    stitch_sheets(card_fronts())
+    write_pdf(card_fronts(CARDS_DIR))
+    write_pdf(card_fronts(CARDS_DIR), SOLAR_SYSTEM_PDF_PATH, SOLAR_SYSTEM_BACK_PATH)
@@ -1,14 +1,186 @@
+import hashlib
+import json
 import os
+import shutil
 import subprocess
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 
+import cairosvg
 from tqdm import tqdm
 
+from cairo_utils import render_tiled, svg_size
 
-for root, _, files in os.walk("images"):
-    new_dir = root.replace("images", "pngs")
-    os.makedirs(new_dir, exist_ok=True)
-    print(root)
-    for filename in tqdm(files):
-        if filename.endswith(".svg"):
-            new_filename = filename.replace(".svg", ".png")
-            subprocess.run(['/Applications/Inkscape.app/Contents/MacOS/inkscape', f'--export-filename={os.path.join(new_dir, new_filename)}', os.path.join(root, filename)])
+SVG_DIR = "images"
+PNG_DIR = "pngs"
+MANIFEST_PATH = "pngs.manifest.json"
+MACOS_INKSCAPE_PATH = "/Applications/Inkscape.app/Contents/MacOS/inkscape"
+# None when there's no Inkscape, in which case everything is rendered with cairosvg
+INKSCAPE_PATH = (
+    os.environ.get("INKSCAPE_PATH")
+    or shutil.which("inkscape")
+    or (MACOS_INKSCAPE_PATH if os.path.exists(MACOS_INKSCAPE_PATH) else None)
+)
+
+# outputs that need Inkscape's renderer (text, custom fonts) rather than cairosvg's, when it's installed
+INKSCAPE_SVGS = {
+    os.path.join(SVG_DIR, "lauvinko_flag.svg"),
+}
+
+# documents with more pixels than this are rendered a tile at a time across all the workers
+TILED_PIXELS = 4096*4096
+
+
+def svg_png_paths(svg_dir=SVG_DIR, png_dir=PNG_DIR):
+    # mirrors the tree under svg_dir into png_dir
+    for root, _, files in os.walk(svg_dir):
+        new_dir = os.path.normpath(os.path.join(png_dir, os.path.relpath(root, svg_dir)))
+        os.makedirs(new_dir, exist_ok=True)
+        for filename in sorted(files):
+            if filename.endswith(".svg"):
+                yield os.path.join(root, filename), os.path.join(new_dir, filename.replace(".svg", ".png"))
+
+
+def render_settings(svg_path, inkscape=False):
+    # these fall back to cairosvg without Inkscape, and are re-rendered once it's installed
+    if INKSCAPE_PATH and (inkscape or svg_path in INKSCAPE_SVGS):
+        return "inkscape"
+    return f"cairosvg {cairosvg.__version__}"
+
+
+def file_hash(path):
+    with open(path, "rb") as fh:
+        return hashlib.sha256(fh.read()).hexdigest()
+
+
+def load_manifest(path=MANIFEST_PATH):
+    # maps each png to the svg it came from, that svg's content hash and the render settings
+    if not os.path.exists(path):
+        return {}
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    with open(path + ".tmp", "w") as fh:
+        json.dump(manifest, fh, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def cairosvg_to_png(svg_path, png_path):
+    cairosvg.svg2png(url=svg_path, write_to=png_path)
+
+
+def tiled_to_png(svg_path, png_path, size, workers=None):
+    with open(svg_path) as fh:
+        render_tiled(fh.read(), size, workers=workers).save(png_path)
+
+
+def inkscape_batch_to_png(paths):
+    # One Inkscape shell session exports the whole batch, so its startup is paid once per batch
+    # rather than once per file.
+    actions = "".join(
+        f"file-open:{svg_path};export-filename:{png_path};export-do;file-close\n"
+        for svg_path, png_path in paths
+    )
+    subprocess.run(
+        [INKSCAPE_PATH, "--shell"],
+        input=actions + "quit\n",
+        text=True,
+        stdout=subprocess.DEVNULL,
+        check=True,
+    )
+
+
+def convert_all(workers=None, sessions=4, inkscape=False, force=False):
+    # Files in INKSCAPE_SVGS (or every file, with inkscape=True) are split between a few Inkscape
+    # shell sessions running alongside the cairosvg process pool. Documents bigger than TILED_PIXELS
+    # are rendered one at a time, each tiled across the whole pool.
+    # PNGs whose svg and render settings match the manifest are skipped unless force is set, and
+    # PNGs in the manifest whose svg has been deleted are removed.
+    if INKSCAPE_PATH is None and (inkscape or any(svg_path in INKSCAPE_SVGS for svg_path, _ in svg_png_paths())):
+        print("Warning: Inkscape not found (set INKSCAPE_PATH), rendering everything with cairosvg")
+
+    manifest = load_manifest()
+    entries = {
+        png_path: {"svg": svg_path, "hash": file_hash(svg_path), "settings": render_settings(svg_path, inkscape)}
+        for svg_path, png_path in svg_png_paths()
+    }
+
+    for png_path in set(manifest) - set(entries):
+        if os.path.exists(png_path):
+            os.remove(png_path)
+
+    paths = [
+        (entry["svg"], png_path)
+        for png_path, entry in entries.items()
+        if force or manifest.get(png_path) != entry or not os.path.exists(png_path)
+    ]
+    print(f"{len(paths)} of {len(entries)} PNGs out of date")
+
+    inkscape_paths = [(svg_path, png_path) for svg_path, png_path in paths if entries[png_path]["settings"] == "inkscape"]
+    cairo_paths = []
+    tiled_paths = []
+    for svg_path, png_path in paths:
+        if entries[png_path]["settings"] == "inkscape":
+            continue
+        with open(svg_path) as fh:
+            size = svg_size(fh.read())
+        if size[0]*size[1] > TILED_PIXELS:
+            tiled_paths.append((svg_path, png_path, size))
+        else:
+            cairo_paths.append((svg_path, png_path))
+
+    batches = [inkscape_paths[i::sessions] for i in range(sessions) if inkscape_paths[i::sessions]]
+    # Inkscape's shell carries on past an export that fails, so its exit status says nothing about
+    # each file. The old PNGs are removed first, so whether a PNG exists afterwards does.
+    for _, png_path in inkscape_paths:
+        if os.path.exists(png_path):
+            os.remove(png_path)
+
+    # Entries are recorded as each PNG is written, and the manifest is saved even if some fail, so
+    # a failure only costs the files that didn't render.
+    out_of_date = {png_path for _, png_path in paths}
+    done = {png_path: entry for png_path, entry in entries.items() if png_path not in out_of_date}
+    failures = []
+
+    def record(png_paths, render, *args):
+        try:
+            render(*args)
+        except Exception as e:
+            print(f"Failed to render {', '.join(png_paths)}: {e!r}")
+            failures.extend(png_paths)
+            return
+
+        missing = [png_path for png_path in png_paths if not os.path.exists(png_path)]
+        if missing:
+            print(f"Failed to render {', '.join(missing)}")
+            failures.extend(missing)
+        done.update((png_path, entries[png_path]) for png_path in png_paths if png_path not in missing)
+
+    try:
+        with ThreadPoolExecutor(max_workers=sessions) as session_pool:
+            session_futures = {
+                session_pool.submit(inkscape_batch_to_png, batch): [png_path for _, png_path in batch]
+                for batch in batches
+            }
+
+            for svg_path, png_path, size in tqdm(tiled_paths):
+                record([png_path], tiled_to_png, svg_path, png_path, size, workers)
+
+            if cairo_paths:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    futures = {pool.submit(cairosvg_to_png, *pair): [pair[1]] for pair in cairo_paths}
+                    for future in tqdm(as_completed(futures), total=len(futures)):
+                        record(futures[future], future.result)
+
+            for future in tqdm(as_completed(session_futures), total=len(session_futures)):
+                record(session_futures[future], future.result)
+    finally:
+        save_manifest(done)
+
+    if failures:
+        raise RuntimeError(f"{len(failures)} PNGs failed to render")
+
+
+if __name__ == "__main__":
+    convert_all()
@@ -1,7 +1,7 @@
-import cairosvg
 from PIL import Image, ImageFont, ImageDraw
-from utils import Color, svg_template, rectangle_template, path_template, polygon_path
-from season_cards import sun_path, moon_path, star_path, earth_path, solar_system_paths, NUMBERS, HALF, EM
+from cairo_utils import CairoCanvas, SpriteCache
+from utils import Color, Path, Rect, draw_scene, polygon_path
+from season_cards import sun_path, moon_path, star_path, earth_path, sun_nodes, moon_nodes, star_nodes, earth_nodes, solar_system_nodes, NUMBERS, HALF, EM
 
 MULTIPLE = 10
 
@@ -20,8 +20,6 @@ FONT_PATH = "../celestial-cards/static/"
 
 PNG_PATH = "pngs/season_cards/tuck_box.png"
 TEMPLATE_PATH = "tuck_box_template.png"
-TMP_SVG_PATH = "temp.svg"
-TMP_PNG_PATH = "temp.png"
 
 Domine = ImageFont.truetype("font/Domine-VariableFont_wght.ttf", 6*MULTIPLE)
 OpenSans = ImageFont.truetype("font/OpenSans-VariableFont_wdth,wght.ttf", 12*MULTIPLE)
@@ -32,44 +30,37 @@ with three-dimensional markings
 """
 
 if __name__ == "__main__":
-    box_template = Image.open(TEMPLATE_PATH)
+    # The shapes on the box are drawn straight onto one cairo canvas, without going through SVG.
+    # cairo only uses installed fonts, not the ones in font/, so the text is drawn with PIL afterwards.
+    shapes = []
+    texts = []
+    # the icons on the cover repeat, so they're blitted from sprites onto the rendered box
+    icons = []
 
-    box_overlay = Image.new("RGBA", (WIDTH, HEIGHT), Color.BLACK.value)
-
-    draw = ImageDraw.Draw(box_overlay, "RGBA")
-
-    def draw_svg_paths(*paths):
-        with open(TMP_SVG_PATH, "w") as fh:
-            fh.write(
-                svg_template(WIDTH, HEIGHT, paths)
-            )
-
-        cairosvg.svg2png(url=TMP_SVG_PATH, write_to=TMP_PNG_PATH)
-
-        shape_img = Image.open(TMP_PNG_PATH)
-        box_overlay.paste(shape_img, (0, 0), shape_img)
+    def draw_shapes(*nodes):
+        shapes.extend(nodes)
 
     ss_cx = LEFT_OFFSET + BOX_WIDTH + BOX_THICKNESS + BOX_WIDTH/2
     ss_cy = TOP_OFFSET + BOX_HEIGHT/2
 
 
 
-    draw_svg_paths(
-        rectangle_template(LEFT_OFFSET + BOX_WIDTH, 0, BOX_THICKNESS, HEIGHT, Color.SPRING_GREEN.value),
-        rectangle_template(0, TOP_OFFSET + BOX_HEIGHT, LEFT_OFFSET + BOX_WIDTH + 2*MULTIPLE, HEIGHT - TOP_OFFSET - BOX_HEIGHT, Color.WINTER_BLUE.value),
-        rectangle_template(0, 0, LEFT_OFFSET + BOX_WIDTH, TOP_OFFSET + BOX_HEIGHT, Color.CREAM.value),
-        rectangle_template(LEFT_OFFSET + BOX_WIDTH + BOX_THICKNESS + BOX_WIDTH, 0, WIDTH - LEFT_OFFSET - BOX_WIDTH - BOX_THICKNESS - BOX_WIDTH, HEIGHT, Color.AUTUMN_RED.value),
-        rectangle_template(LEFT_OFFSET + BOX_WIDTH + BOX_THICKNESS - 2*MULTIPLE, 0, BOX_WIDTH + 4*MULTIPLE, TOP_OFFSET - 1*MULTIPLE, Color.SUMMER_GOLD.value),
+    draw_shapes(
+        Rect(LEFT_OFFSET + BOX_WIDTH, 0, BOX_THICKNESS, HEIGHT, fill=Color.SPRING_GREEN.value),
+        Rect(0, TOP_OFFSET + BOX_HEIGHT, LEFT_OFFSET + BOX_WIDTH + 2*MULTIPLE, HEIGHT - TOP_OFFSET - BOX_HEIGHT, fill=Color.WINTER_BLUE.value),
+        Rect(0, 0, LEFT_OFFSET + BOX_WIDTH, TOP_OFFSET + BOX_HEIGHT, fill=Color.CREAM.value),
+        Rect(LEFT_OFFSET + BOX_WIDTH + BOX_THICKNESS + BOX_WIDTH, 0, WIDTH - LEFT_OFFSET - BOX_WIDTH - BOX_THICKNESS - BOX_WIDTH, HEIGHT, fill=Color.AUTUMN_RED.value),
+        Rect(LEFT_OFFSET + BOX_WIDTH + BOX_THICKNESS - 2*MULTIPLE, 0, BOX_WIDTH + 4*MULTIPLE, TOP_OFFSET - 1*MULTIPLE, fill=Color.SUMMER_GOLD.value),
 
-        *solar_system_paths(ss_cx, ss_cy, .63),
+        *solar_system_nodes(ss_cx, ss_cy, .63),
 
-        star_path(LEFT_OFFSET + BOX_WIDTH/2, TOP_OFFSET + BOX_HEIGHT + BOX_THICKNESS/2, CELESTIAL_RADIUS, Color.CREAM),
-        earth_path(LEFT_OFFSET + BOX_WIDTH + BOX_THICKNESS/2, TOP_OFFSET + BOX_HEIGHT/2, CELESTIAL_RADIUS, Color.CREAM),
-        sun_path(LEFT_OFFSET + BOX_WIDTH + BOX_THICKNESS + BOX_WIDTH/2, TOP_OFFSET - BOX_THICKNESS/2, CELESTIAL_RADIUS, Color.BLACK),
-        moon_path(LEFT_OFFSET + BOX_WIDTH + BOX_THICKNESS + BOX_WIDTH + BOX_THICKNESS/2, TOP_OFFSET + BOX_HEIGHT/2, CELESTIAL_RADIUS, Color.BLACK),
+        *star_nodes(LEFT_OFFSET + BOX_WIDTH/2, TOP_OFFSET + BOX_HEIGHT + BOX_THICKNESS/2, CELESTIAL_RADIUS, Color.CREAM),
+        *earth_nodes(LEFT_OFFSET + BOX_WIDTH + BOX_THICKNESS/2, TOP_OFFSET + BOX_HEIGHT/2, CELESTIAL_RADIUS, Color.CREAM),
+        *sun_nodes(LEFT_OFFSET + BOX_WIDTH + BOX_THICKNESS + BOX_WIDTH/2, TOP_OFFSET - BOX_THICKNESS/2, CELESTIAL_RADIUS, Color.BLACK),
+        *moon_nodes(LEFT_OFFSET + BOX_WIDTH + BOX_THICKNESS + BOX_WIDTH + BOX_THICKNESS/2, TOP_OFFSET + BOX_HEIGHT/2, CELESTIAL_RADIUS, Color.BLACK),
 
         # triangles in the bleed zones
-        path_template(
+        Path(
                 polygon_path(
                 [
                     (0, TOP_OFFSET + BOX_HEIGHT + 45*MULTIPLE),
@@ -77,9 +68,9 @@ if __name__ == "__main__":
                     (LEFT_OFFSET, TOP_OFFSET + BOX_HEIGHT),
                 ],
             ),
-            Color.CREAM.value,
+            fill=Color.CREAM.value,
         ),
-        path_template(
+        Path(
             polygon_path(
                 [
                     (LEFT_OFFSET + BOX_WIDTH, TOP_OFFSET),
@@ -87,9 +78,9 @@ if __name__ == "__main__":
                     (LEFT_OFFSET + BOX_WIDTH - 50*MULTIPLE, TOP_OFFSET - 50*MULTIPLE),
                 ],
             ),
-            Color.SPRING_GREEN.value,
+            fill=Color.SPRING_GREEN.value,
         ),
-        path_template(
+        Path(
             polygon_path(
                 [
                     (LEFT_OFFSET + BOX_WIDTH + BOX_THICKNESS, TOP_OFFSET + BOX_HEIGHT),
@@ -97,9 +88,9 @@ if __name__ == "__main__":
                     (LEFT_OFFSET + BOX_WIDTH + BOX_THICKNESS + 50*MULTIPLE, TOP_OFFSET + BOX_HEIGHT + 50*MULTIPLE),
                 ],
             ),
-            Color.SPRING_GREEN.value,
+            fill=Color.SPRING_GREEN.value,
         ),
-        path_template(
+        Path(
             polygon_path(
                 [
                     (LEFT_OFFSET + BOX_WIDTH + BOX_THICKNESS + BOX_WIDTH, TOP_OFFSET + BOX_HEIGHT),
@@ -107,14 +98,14 @@ if __name__ == "__main__":
                     (LEFT_OFFSET + BOX_WIDTH + BOX_THICKNESS + BOX_WIDTH - 50*MULTIPLE, TOP_OFFSET + BOX_HEIGHT + 50*MULTIPLE),
                 ],
             ),
-            Color.AUTUMN_RED.value,
+            fill=Color.AUTUMN_RED.value,
         ),
     )
 
     cover_cx = LEFT_OFFSET + BOX_WIDTH/2
     line_spacing = 3*MULTIPLE
 
-    draw.text(
+    texts.append(dict(
         xy=(
             cover_cx,
             TOP_OFFSET + BOX_HEIGHT*.17,
@@ -125,7 +116,7 @@ if __name__ == "__main__":
         font=Domine,
         anchor='mm',
         spacing=line_spacing,
-    )
+    ))
 
     spacing = 28*MULTIPLE
     card_face_scale = .6*MULTIPLE/EM
@@ -137,10 +128,8 @@ if __name__ == "__main__":
         ('Star', star_path),
     ]):
         cx = cover_cx + (i - 1.5) * spacing
-        draw_svg_paths(
-            shape(cx, TOP_OFFSET + BOX_HEIGHT * .29, 7*MULTIPLE, Color.BLACK),
-        )
-        draw.text(
+        icons.append((cx, TOP_OFFSET + BOX_HEIGHT * .29, shape, 7*MULTIPLE, Color.BLACK, 1))
+        texts.append(dict(
             xy=(
                 cx,
                 TOP_OFFSET + BOX_HEIGHT * .36,
@@ -150,17 +139,17 @@ if __name__ == "__main__":
             fill=Color.BLACK.value,
             font=Domine,
             anchor="mm",
-        )
+        ))
 
     for i, number in enumerate(["One", "Two", "Three", "Four", "Five"]):
         cx = cover_cx + (i-2)*spacing
         ni = NUMBERS[i]
         cy = TOP_OFFSET + BOX_HEIGHT*.47
-        draw_svg_paths(*[
-            star_path(cx + (x - HALF)*card_face_scale, cy + (y - HALF)*card_face_scale, ni.radius*card_face_scale, Color.BLACK)
+        icons.extend(
+            (cx + (x - HALF)*card_face_scale, cy + (y - HALF)*card_face_scale, star_path, ni.radius, Color.BLACK, card_face_scale)
             for x, y in ni.centers
-        ])
-        draw.text(
+        )
+        texts.append(dict(
             xy=(
                 cx,
                 TOP_OFFSET + BOX_HEIGHT*.555,
@@ -170,7 +159,7 @@ if __name__ == "__main__":
             fill=Color.BLACK.value,
             font=Domine,
             anchor="mm",
-        )
+        ))
 
     for i, (color, words) in enumerate([
         (Color.CREAM, ["Air", "Void", "Beltane", "Samhain"]),
@@ -184,27 +173,27 @@ if __name__ == "__main__":
         side_length = 12*MULTIPLE
         border_width = .5*MULTIPLE
         square_top = TOP_OFFSET + BOX_HEIGHT * .62
-        draw_svg_paths(
-            rectangle_template(
+        draw_shapes(
+            Rect(
                 cx - side_length/2 - border_width,
                 square_top - border_width,
                 side_length + 2*border_width,
                 side_length + 2*border_width,
-                Color.BLACK.value,
+                fill=Color.BLACK.value,
                 radius=2*MULTIPLE,
             ),
-            rectangle_template(
+            Rect(
                 cx - side_length/2,
                 square_top,
                 side_length,
                 side_length,
-                color.value,
+                fill=color.value,
                 radius=2*MULTIPLE,
             )
         )
 
         for j, word in enumerate(words):
-            draw.text(
+            texts.append(dict(
                 xy=(
                     cx,
                     TOP_OFFSET + BOX_HEIGHT * (.72 + .045*j),
@@ -214,9 +203,9 @@ if __name__ == "__main__":
                 fill=Color.BLACK.value,
                 font=Domine,
                 anchor="mm",
-            )
+            ))
 
-    draw.text(
+    texts.append(dict(
         xy=(
             cover_cx,
             TOP_OFFSET + BOX_HEIGHT * .94,
@@ -227,9 +216,22 @@ if __name__ == "__main__":
         font=Domine,
         anchor='mm',
         spacing=line_spacing,
-    )
+    ))
+
+    canvas = CairoCanvas(WIDTH, HEIGHT, Color.BLACK.value)
+    draw_scene(canvas, shapes)
+    box_overlay = canvas.image()
+
+    sprites = SpriteCache()
+    for icon_cx, icon_cy, shape, radius, color, scale in icons:
+        sprites.paste(box_overlay, icon_cx, icon_cy, shape, radius, color, scale)
+
+    draw = ImageDraw.Draw(box_overlay, "RGBA")
+    for text in texts:
+        draw.text(**text)
 
-    box_template = box_template.resize((box_template.width*MULTIPLE, box_template.height*MULTIPLE))
-    Image.Image.paste(box_overlay, box_template, (0, 0), box_template)
+    with Image.open(TEMPLATE_PATH) as box_template:
+        box_template = box_template.resize((box_template.width*MULTIPLE, box_template.height*MULTIPLE))
+    box_overlay.paste(box_template, (0, 0), box_template)
 
     box_overlay.save(PNG_PATH)
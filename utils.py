@@ -1,6 +1,7 @@
 import colorsys
 from dataclasses import dataclass
 from enum import Enum
+from itertools import groupby
 import math
 
 
@@ -322,63 +323,287 @@ class Rotation:
     cy: int
 
 
-def path_template(vertex_string, color):
-    return f'<path d="{vertex_string}" fill="{color}"/>'
+def svg_attributes(fields):
+    param_strings = []
+    for key, value in fields.items():
+        if value is not None:
+            param_strings.append(f"{key}=\"{value}\"")
+    return " ".join(param_strings)
 
 
-def rectangle_template(x: int, y: int, width: int, height: int, color: str, radius: int = 0, rotation: Rotation | None = None):
-    fields = {
-        "x": x,
-        "y": y,
-        "width": width,
-        "height": height,
-        "rx": radius,
-        "fill": color,
-    }
-    if rotation:
-        fields["transform"] = f"rotate({rotation.degrees}, {rotation.cx}, {rotation.cy})"
+def rotate_transform(rotation: Rotation):
+    return f"rotate({rotation.degrees}, {rotation.cx}, {rotation.cy})"
 
-    param_strings = []
-    for key, value in fields.items():
-        param_strings.append(f"{key}=\"{value}\"")
 
-    return f'<rect {" ".join(param_strings)}/>'
+# A small scene graph. Nodes keep their geometry as numbers (or path data) until svg() is called, so
+# drawings can be inspected and transformed, and drawn by other backends: draw(canvas, defs) draws
+# a node onto a cairo_utils.CairoCanvas, where defs maps ids to the nodes that masks and <use>
+# elements refer to (see draw_scene).
+
+class Node:
+    __slots__ = ()
+
+    def svg(self) -> str:
+        raise NotImplementedError
+
+    def draw(self, canvas, defs):
+        raise NotImplementedError
+
+    def children(self):
+        return ()
+
+    def __str__(self):
+        return self.svg()
+
+
+class Shape(Node):
+    # something with a fill and/or a stroke, optionally masked by the Mask with id mask
+    __slots__ = ("fill", "stroke", "stroke_width", "mask")
+
+    def __init__(self, fill=None, stroke=None, stroke_width=None, mask=None):
+        self.fill = fill
+        self.stroke = stroke
+        self.stroke_width = stroke_width
+        self.mask = mask
+
+    def paint_fields(self):
+        return {
+            "stroke": self.stroke,
+            "stroke-width": self.stroke_width,
+            "fill": self.fill if self.fill is not None or self.stroke is None else "none",
+            "mask": None if self.mask is None else f"url(#{self.mask})",
+        }
+
+    def paint_color(self):
+        # SVG fills a shape black when it's given neither a fill nor a stroke
+        return "#000000" if self.fill is None and self.stroke is None else self.fill
+
+    def draw(self, canvas, defs):
+        if self.mask is None:
+            self.draw_shape(canvas)
+        else:
+            with canvas.masked(lambda mask_canvas: defs[self.mask].draw_mask(mask_canvas, defs)):
+                self.draw_shape(canvas)
+
+    def draw_shape(self, canvas):
+        raise NotImplementedError
+
+
+class Path(Shape):
+    __slots__ = ("d",)
+
+    def __init__(self, d, fill=None, stroke=None, stroke_width=None, mask=None):
+        super().__init__(fill, stroke, stroke_width, mask)
+        self.d = d
+
+    def svg(self):
+        return f'<path {svg_attributes({"d": self.d, **self.paint_fields()})}/>'
+
+    def draw_shape(self, canvas):
+        canvas.path(self.d, self.paint_color(), self.stroke, self.stroke_width or 1)
+
+
+class Rect(Shape):
+    __slots__ = ("x", "y", "width", "height", "radius", "rotation")
+
+    def __init__(self, x, y, width, height, fill=None, radius=0, rotation: Rotation | None = None, stroke=None,
+                 stroke_width=None, mask=None):
+        super().__init__(fill, stroke, stroke_width, mask)
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.radius = radius
+        self.rotation = rotation
+
+    def svg(self):
+        fields = {
+            "x": self.x,
+            "y": self.y,
+            "width": self.width,
+            "height": self.height,
+            "rx": self.radius,
+            **self.paint_fields(),
+            "transform": rotate_transform(self.rotation) if self.rotation else None,
+        }
+        return f'<rect {svg_attributes(fields)}/>'
+
+    def draw_shape(self, canvas):
+        canvas.rectangle(
+            self.x, self.y, self.width, self.height, self.paint_color(), self.radius, self.rotation, self.stroke,
+            self.stroke_width or 1,
+        )
+
+
+class Circle(Shape):
+    __slots__ = ("cx", "cy", "radius")
+
+    def __init__(self, cx, cy, radius, fill=None, stroke=None, stroke_width=None, mask=None):
+        super().__init__(fill, stroke, stroke_width, mask)
+        self.cx = cx
+        self.cy = cy
+        self.radius = radius
+
+    def svg(self):
+        return f'<circle {svg_attributes({"cx": self.cx, "cy": self.cy, "r": self.radius, **self.paint_fields()})}/>'
+
+    def draw_shape(self, canvas):
+        canvas.circle(self.cx, self.cy, self.radius, self.paint_color(), self.stroke, self.stroke_width or 1)
+
+
+class Group(Node):
+    __slots__ = ("nodes", "id", "translate", "rotation")
+
+    def __init__(self, nodes, id=None, translate=(0, 0), rotation: Rotation | None = None):
+        self.nodes = list(nodes)
+        self.id = id
+        self.translate = translate
+        self.rotation = rotation
+
+    def transform(self):
+        transforms = []
+        if self.translate != (0, 0):
+            transforms.append(f"translate({self.translate[0]} {self.translate[1]})")
+        if self.rotation:
+            transforms.append(rotate_transform(self.rotation))
+        return " ".join(transforms) or None
+
+    def svg(self):
+        attributes = svg_attributes({"id": self.id, "transform": self.transform()})
+        return f'<g{" " + attributes if attributes else ""}>\n' + "\n".join(node.svg() for node in self.nodes) + "\n</g>"
+
+    def draw(self, canvas, defs):
+        with canvas.transformed(self.translate, self.rotation):
+            draw_nodes(canvas, self.nodes, defs)
+
+    def children(self):
+        return self.nodes
+
+
+class Mask(Node):
+    # Only drawn where a Shape refers to it. SVG masks by luminance and cairo by alpha, so on a canvas
+    # the children filled black are left out and the rest count as opaque.
+    __slots__ = ("id", "nodes")
+
+    def __init__(self, id, nodes):
+        self.id = id
+        self.nodes = list(nodes)
+
+    def svg(self):
+        return f'<mask id="{self.id}">\n' + "\n".join(node.svg() for node in self.nodes) + "\n</mask>"
+
+    def draw(self, canvas, defs):
+        pass
+
+    def draw_mask(self, canvas, defs):
+        draw_nodes(canvas, [
+            node for node in self.nodes
+            if not (isinstance(node, Shape) and node.paint_color() in ("black", "#000000"))
+        ], defs)
+
+    def children(self):
+        return self.nodes
+
+
+class Use(Node):
+    # another copy of the node with id href, moved by (x, y)
+    __slots__ = ("href", "x", "y")
+
+    def __init__(self, href, x=0, y=0):
+        self.href = href
+        self.x = x
+        self.y = y
+
+    def svg(self):
+        return f'<use href="#{self.href}" x="{self.x}" y="{self.y}"/>'
+
+    def draw(self, canvas, defs):
+        with canvas.transformed((self.x, self.y)):
+            defs[self.href].draw(canvas, defs)
+
+
+def walk(nodes):
+    for node in nodes:
+        yield node
+        yield from walk(node.children())
+
+
+def draw_nodes(canvas, nodes, defs):
+    # Shapes in a row under the same mask are drawn into one group and masked together, rather
+    # than the mask being drawn again for each of them.
+    for mask, run in groupby(nodes, key=lambda node: getattr(node, "mask", None)):
+        if mask is None:
+            for node in run:
+                node.draw(canvas, defs)
+        else:
+            with canvas.masked(lambda mask_canvas: defs[mask].draw_mask(mask_canvas, defs)):
+                for node in run:
+                    node.draw_shape(canvas)
+
+
+def draw_scene(canvas, nodes):
+    defs = {node.id: node for node in walk(nodes) if getattr(node, "id", None) is not None}
+    draw_nodes(canvas, nodes, defs)
+
+
+def nodes_template(nodes):
+    return "\n".join(node.svg() for node in nodes)
+
+
+def path_template(vertex_string, color):
+    return Path(vertex_string, fill=color).svg()
+
+
+def rectangle_template(x: int, y: int, width: int, height: int, color: str, radius: int = 0, rotation: Rotation | None = None):
+    return Rect(x, y, width, height, fill=color, radius=radius, rotation=rotation).svg()
 
 
 def circle_template(cx, cy, radius, color):
-    return f'<circle cx="{cx}" cy="{cy}" r="{radius}" fill="{color}"/>'
+    return Circle(cx, cy, radius, fill=color).svg()
 
 
-def crescent_moon_template(cx: int, cy: int, radius: int, color: str, rotation: float, percent: float):
+def crescent_moon_path(cx: int, cy: int, radius: int, rotation: float, percent: float):
+    # the outline of a moon that is between 0 and 1 (exclusive) full
     start_radians = rotation - math.pi/2
     end_radians = rotation + math.pi/2
 
     arc_start_x, arc_start_y = round(cx + radius*math.cos(start_radians)), round(cy + radius*math.sin(start_radians))
     arc_end_x, arc_end_y = round(cx + radius*math.cos(end_radians)), round(cy + radius*math.sin(end_radians))
 
-    if percent < 0:
+    if percent <= 0:
         raise ValueError
-    if percent == 0:
-        return ""
     if percent == .5:
-        return f'<path d="M{arc_start_x} {arc_start_y}A{radius} {radius} 0 1 0 {arc_end_x} {arc_end_y} z" fill="{color}"/>'
+        return f'M{arc_start_x} {arc_start_y}A{radius} {radius} 0 1 0 {arc_end_x} {arc_end_y} z'
     elif percent < .5:
         d = 1 - 2*percent
         inner_radius = radius*(d**2 + 1)/(2*d)
 
-        return f'<path d="M{arc_start_x} {arc_start_y}A{radius} {radius} 0 1 0 {arc_end_x} {arc_end_y} {inner_radius} {inner_radius} 0 0 1 {arc_start_x} {arc_start_y}z" fill="{color}"/>'
+        return f'M{arc_start_x} {arc_start_y}A{radius} {radius} 0 1 0 {arc_end_x} {arc_end_y} {inner_radius} {inner_radius} 0 0 1 {arc_start_x} {arc_start_y}z'
     elif percent < 1:
         d = 2*percent - 1
         inner_radius = radius*(d**2 + 1)/(2*d)
 
-        return f'<path d="M{arc_start_x} {arc_start_y}A{radius} {radius} 0 1 0 {arc_end_x} {arc_end_y} {inner_radius} {inner_radius} 1 0 0 {arc_start_x} {arc_start_y}z" fill="{color}"/>'
-    elif percent == 1:
-        return circle_template(cx, cy, radius, color)
+        return f'M{arc_start_x} {arc_start_y}A{radius} {radius} 0 1 0 {arc_end_x} {arc_end_y} {inner_radius} {inner_radius} 1 0 0 {arc_start_x} {arc_start_y}z'
     else:
         raise ValueError
 
 
+def crescent_moon_nodes(cx: int, cy: int, radius: int, color: str, rotation: float, percent: float):
+    if percent < 0:
+        raise ValueError
+    if percent == 0:
+        return []
+    if percent == 1:
+        return [Circle(cx, cy, radius, fill=color)]
+    return [Path(crescent_moon_path(cx, cy, radius, rotation, percent), fill=color)]
+
+
+def crescent_moon_template(cx: int, cy: int, radius: int, color: str, rotation: float, percent: float):
+    return nodes_template(crescent_moon_nodes(cx, cy, radius, color, rotation, percent))
+
+
 def svg_template(width, height, paths, background_color=None):
+    # paths can be SVG strings or Nodes
     if background_color:
-        paths = [f'<rect width="100%" height="100%" fill="{background_color}"/>'] + paths
-    return f'<svg height="{height}" width="{width}">\n' + "\n".join(paths) + '\n</svg>'
+        paths = [f'<rect width="100%" height="100%" fill="{background_color}"/>'] + list(paths)
+    return f'<svg height="{height}" width="{width}">\n' + "\n".join(str(path) for path in paths) + '\n</svg>'
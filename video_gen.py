@@ -1,189 +1,347 @@
 import math
+
 from tqdm import tqdm
-# from pydub import AudioSegment
 import numpy as np
-from PIL import Image, ImageDraw, ImageFont
-import cv2
+from PIL import Image, ImageFont
+
+from audio_utils import AudioTimeline, load_clip
+from raster_utils import BandedPNGWriter, GlyphCache
+from video_utils import FFmpegSink, FrameCache, FrameStore, VideoSink, encode_segments, render_frames
 
 
 SyneMono = ImageFont.truetype("font/SyneMono-Regular.ttf", 200)
 KodeMono = ImageFont.truetype("font/KodeMono-VariableFont_wght.ttf", 200)
 BungeeHairline = ImageFont.truetype("font/BungeeHairline-Regular.ttf", 200)
 
-# Keystroke = AudioSegment.from_file("audio/typewriter.wav")
-# Keyboard = AudioSegment.from_file("audio/mechanical-keyboard.mp3")
-# Click = AudioSegment.from_file("audio/click-button.mp3")
-# Logo = AudioSegment.from_file("audio/futuristic-logo.mp3")
-# Woosh = AudioSegment.from_file("audio/ethereal-woosh.wav")
+glyphs = GlyphCache()
 
 SAMPLE_RATE = 44100
 SIDE_LENGTH = 1000
 FRAMERATE = 50
 
+INTRO_FRAMES = 50
+KEYSTROKE_FRAMES = 3
+LINE_HOLD_FRAMES = 50
+DATE_FRAMES = 130
+
 text_lines = ["DVLV 9", "CHROMA"]
+date_line = "AUG 17"
 horizontal_spacing = 120
 vertical_spacing = 200
 
+light_colors = [
+    ((255, 0, 0), (63, 0, 0)),
+    ((255, 127, 0), (63, 63, 0)),
+    ((255, 0, 255), (0, 0, 127)),
+    ((191, 255, 0), (63, 0, 0)),
+    ((0, 255, 0), (63, 63, 0)),
+    ((0, 127, 255), (0, 0, 127)),
+]
+light_distance_decay = 60
 
-def chroma_promo():
+beat_length = 42.5
+num_beats = 4
+
+
+def character_positions(lines, side_length=SIDE_LENGTH, scale=1):
+    for i, line in enumerate(lines):
+        for j, c in enumerate(line):
+            x = side_length/2 + (-len(line) + 1 + 2*j)*horizontal_spacing*scale/2
+            y = side_length/2 + (-len(lines) + 1 + 2*i)*vertical_spacing*scale/2
+            yield i, c, (x, y)
+
+
+class LightField:
+    # Each light is ((kx, ky), (pulsing_color, glow_color)). The pulsing color falls off as
+    # 2**(-d/decay) scaled by the frame's kernel brightness; the glow color is static and only
+    # starts falling off glow_radius px from the light, at half the rate.
+    def __init__(self, dims, lights, decay, glow_radius=120):
+        width, height = dims
+        ys, xs = np.mgrid[0:height, 0:width].astype(np.float64)
+
+        self.falloffs = []
+        self.static = np.zeros((height, width, 3), dtype=np.uint16)
+
+        for (kx, ky), (pulsing_color, glow_color) in lights:
+            distance = np.sqrt((xs - kx)**2 + (ys - ky)**2)
+            self.falloffs.append((np.power(2.0, -distance/decay), pulsing_color))
+
+            glow_fraction = np.power(2.0, -np.maximum(0.0, distance - glow_radius)/(2*decay))
+            for channel, dc in enumerate(glow_color):
+                if dc:
+                    self.static[..., channel] += np.rint(dc*glow_fraction).astype(np.uint16)
+
+    def render(self, base, kernel_brightness_fraction):
+        # Adding with saturation at every step is the same as adding everything and saturating
+        # once, since every term is non-negative.
+        out = np.asarray(base, dtype=np.uint16) + self.static
+
+        for falloff, pulsing_color in self.falloffs:
+            fraction = kernel_brightness_fraction*falloff
+            for channel, dc in enumerate(pulsing_color):
+                if dc:
+                    out[..., channel] += np.rint(dc*fraction).astype(np.uint16)
+
+        np.minimum(out, 255, out=out)
+        return out.astype(np.uint8)
+
+
+_glow_field = None
+_glow_base = None
+
+
+def _init_glow_renderer(dims, lights, decay, glow_radius, base):
+    global _glow_field, _glow_base
+    _glow_field = LightField(dims, lights, decay, glow_radius)
+    _glow_base = base
 
-    videodims = (SIDE_LENGTH-1,SIDE_LENGTH-1)
-    fourcc = cv2.VideoWriter_fourcc(*'XVID')
-    video = cv2.VideoWriter("videos/chroma_promo.mp4", fourcc, FRAMERATE, videodims)
-    # audio = AudioSegment.silent(10000, frame_rate=SAMPLE_RATE)
-    img = Image.new('RGB', videodims, color = 'black')
 
-    total_frames = 0
+def render_glow_frame(kernel_brightness_fraction):
+    return _glow_field.render(_glow_base, kernel_brightness_fraction)
 
-    def write_image(im, frames=1):
-        nonlocal total_frames
-        imtemp = im.copy()
-        for _ in range(frames):
-            video.write(cv2.cvtColor(np.array(imtemp), cv2.COLOR_RGB2BGR))
-        total_frames += frames
 
-    write_image(img, 50)
+def chroma_promo_audio(path="audio/chroma_promo.wav"):
+    # Follows the same frame timing as the typewriter section of chroma_promo
+    keyboard = load_clip("audio/mechanical-keyboard.mp3", SAMPLE_RATE)
+    click = load_clip("audio/click-button.mp3", SAMPLE_RATE)
+    logo = load_clip("audio/futuristic-logo.mp3", SAMPLE_RATE)
 
-    draw = ImageDraw.Draw(img)
+    audio = AudioTimeline(10000, SAMPLE_RATE)
+    total_frames = INTRO_FRAMES
 
     for i, line in enumerate(text_lines):
-        # line_start_frames = total_frames
+        line_start_frames = total_frames
+
+        for _ in line:
+            audio.overlay(click, total_frames * 1000 / FRAMERATE)
+            total_frames += KEYSTROKE_FRAMES
+
+        offset = [10, 80][i]
+        audio.overlay(
+            keyboard[
+                round(SAMPLE_RATE*offset/FRAMERATE):
+                round(SAMPLE_RATE*(offset + total_frames - line_start_frames)/FRAMERATE)
+            ],
+            total_frames * 1000 / FRAMERATE,
+        )
 
-        for j, c in enumerate(line):
-            # audio = audio.overlay(Click, total_frames * 1000 / FRAMERATE)
+        total_frames += LINE_HOLD_FRAMES
 
-            x = SIDE_LENGTH/2 + (-len(line) + 1 + 2*j)*horizontal_spacing/2
-            y = SIDE_LENGTH/2 + (-len(text_lines) + 1 + 2*i)*vertical_spacing/2
+    audio.overlay(logo, total_frames*1000/FRAMERATE - 700)
+    audio.export(path)
 
-            draw.text(
-                (x, y),
-                text=c,
-                fill="#ffffff",
-                font=BungeeHairline,
-                anchor="mm",
-            )
 
-            write_image(img, 3)
+def promo_geometry(preview):
+    scale = 1/preview
+    font = BungeeHairline if preview == 1 else BungeeHairline.font_variant(size=round(BungeeHairline.size*scale))
+    renderdims = (math.ceil((SIDE_LENGTH-1)*scale), math.ceil((SIDE_LENGTH-1)*scale))
+    return scale, SIDE_LENGTH*scale, font, renderdims
 
-        # offset = [10, 80][i]
-        # audio = audio.overlay(
-        #     Keyboard.get_sample_slice(
-        #         round(SAMPLE_RATE*offset/FRAMERATE),
-        #         round(SAMPLE_RATE*(offset + total_frames - line_start_frames)/FRAMERATE),
-        #     ),
-        #     total_frames * 1000 / FRAMERATE,
-        # )
 
-        write_image(img, 50)
+def typed_image(preview, lines, typed_lines=None):
+    # lines are laid out as a block, but only the first typed_lines of them are drawn
+    scale, side_length, font, renderdims = promo_geometry(preview)
+    img = Image.new('RGB', renderdims, color='black')
+    for i, c, xy in character_positions(lines, side_length, scale):
+        if typed_lines is None or i < typed_lines:
+            glyphs.draw(img, xy, c, "#ffffff", font)
+    return img
 
-    img.save("pngs/dvlv9.png")
-    print("Saved png")
 
-    # audio = audio.overlay(Logo, total_frames*1000/FRAMERATE - 700)
+# Each promo segment writes its frames to a sink and only depends on its arguments, so segments
+# can be rendered in any order (or in parallel) and concatenated.
 
-    colors = [
-        ((255, 0, 0), (63, 0, 0)),
-        ((255, 127, 0), (63, 63, 0)),
-        ((255, 0, 255), (0, 0, 127)),
-        ((191, 255, 0), (63, 0, 0)),
-        ((0, 255, 0), (63, 63, 0)),
-        ((0, 127, 255), (0, 0, 127)),
-    ]
-    light_distance_decay = 60
+def promo_intro(video, preview):
+    video.write(typed_image(preview, text_lines, 0), INTRO_FRAMES)
+
+
+def promo_typewriter_line(video, preview, i):
+    scale, side_length, font, _ = promo_geometry(preview)
+    img = typed_image(preview, text_lines, i)
+
+    for line, c, xy in character_positions(text_lines, side_length, scale):
+        if line != i:
+            continue
+
+        box = glyphs.draw(img, xy, c, "#ffffff", font)
+
+        # only the new character needs converting
+        video.write(img, KEYSTROKE_FRAMES, dirty=[box])
+
+    video.write(img, LINE_HOLD_FRAMES, dirty=[])
 
-    beat_length = 42.5
-    num_beats = 4
-    frame_resolution = 1
+    if i == len(text_lines) - 1 and preview == 1:
+        img.save("pngs/dvlv9.png")
+        print("Saved png")
 
-    for frame in tqdm(range(0, round(beat_length * num_beats), frame_resolution)):
-        imtemp = img.copy()
 
-        for i, color in enumerate(colors):
-            kx = (2*(i%3) + 1)*SIDE_LENGTH/6
-            ky = 0 if i < 3 else SIDE_LENGTH - 2
+def promo_glow(video, preview, start, end, workers=1):
+    scale, side_length, _, renderdims = promo_geometry(preview)
+    frame_resolution = preview
 
+    lights = [
+        (((2*(i%3) + 1)*side_length/6, 0 if i < 3 else side_length - 2*scale), color)
+        for i, color in enumerate(light_colors)
+    ]
+
+    # Frames a FrameStore already has from an interrupted render are skipped. The last frame's hold
+    # is cut short so that skipping frames for a preview doesn't change the timing.
+    glow_start = video.total_frames
+    pending = []
+    for frame in range(start, end, frame_resolution):
+        position = glow_start + frame - start
+        hold = min(frame_resolution, end - frame)
+        if not video.stored(position, hold):
             kernel_brightness_fraction = .5 + 16*(
                 (((frame % beat_length) - (beat_length / 2))/beat_length)**4
             )
+            pending.append((position, hold, kernel_brightness_fraction))
+
+    positions = iter(pending)
+
+    def write_glow(glow):
+        position, hold, _ = next(positions)
+        video.seek(position)
+        video.write(glow, hold)
+
+    # Glow frames only depend on the kernel brightness, which repeats every beat (and is symmetric
+    # within it), so most of them can be reused.
+    glow_cache = FrameCache()
+
+    render_frames(
+        render_glow_frame,
+        (kernel_brightness_fraction for _, _, kernel_brightness_fraction in tqdm(pending)),
+        write_glow,
+        workers=workers,
+        cache=glow_cache,
+        initializer=_init_glow_renderer,
+        initargs=(
+            renderdims,
+            lights,
+            light_distance_decay*scale,
+            120*scale,
+            np.array(typed_image(preview, text_lines)),
+        ),
+    )
+
+    video.seek(glow_start + end - start)
+    print(glow_cache.report("Glow frame"))
+
+
+def promo_date(video, preview):
+    video.write(typed_image(preview, [date_line]), DATE_FRAMES)
+
+
+def chroma_promo_segments(preview, workers=1, split_beats=False):
+    glow_frames = round(beat_length * num_beats)
+    if split_beats:
+        beat_starts = [round(b * beat_length) for b in range(num_beats)] + [glow_frames]
+        glow = [(promo_glow, (preview, beat_starts[b], beat_starts[b+1])) for b in range(num_beats)]
+    else:
+        glow = [(promo_glow, (preview, 0, glow_frames, workers))]
+
+    return [
+        (promo_intro, (preview,)),
+        *[(promo_typewriter_line, (preview, i)) for i in range(len(text_lines))],
+        *glow,
+        (promo_date, (preview,)),
+    ]
 
-            for x in range(SIDE_LENGTH-1):
-                for y in range(SIDE_LENGTH-1):
-                    r, g, b = imtemp.getpixel((x, y))
-                    distance = math.sqrt((x - kx)**2 + (y - ky)**2)
-                    lower_brightness_fraction = kernel_brightness_fraction * (2**(-distance/light_distance_decay))
-                    higher_brightness_fraction = (2**(-max(0.0, distance - 120)/(2*light_distance_decay)))
-
-                    dr, dg, db = color[0]
-                    r = min(r + round(dr*lower_brightness_fraction), 255)
-                    g = min(g + round(dg*lower_brightness_fraction), 255)
-                    b = min(b + round(db*lower_brightness_fraction), 255)
-
-                    dr, dg, db = color[1]
-                    r = min(r + round(dr * higher_brightness_fraction), 255)
-                    g = min(g + round(dg * higher_brightness_fraction), 255)
-                    b = min(b + round(db * higher_brightness_fraction), 255)
-
-                    imtemp.putpixel((x, y), (r, g, b))
-
-        write_image(imtemp, frame_resolution)
-
-    date_img = Image.new('RGB', videodims, color='black')
-    date_draw = ImageDraw.Draw(date_img)
-    date_line = "AUG 17"
-    for j, c in enumerate(date_line):
-        x = SIDE_LENGTH / 2 + (-len(date_line) + 1 + 2 * j) * horizontal_spacing / 2
-        y = SIDE_LENGTH / 2
-
-        date_draw.text(
-            (x, y),
-            text=c,
-            fill="#ffffff",
-            font=BungeeHairline,
-            anchor="mm",
+
+def chroma_promo_frame_count():
+    return (
+        INTRO_FRAMES
+        + sum(len(line)*KEYSTROKE_FRAMES + LINE_HOLD_FRAMES for line in text_lines)
+        + round(beat_length * num_beats)
+        + DATE_FRAMES
+    )
+
+
+def chroma_promo_params(preview):
+    # everything the rendered frames depend on, to key a FrameStore
+    return {
+        "preview": preview,
+        "side_length": SIDE_LENGTH,
+        "font": (BungeeHairline.path, BungeeHairline.size),
+        "text": (text_lines, date_line, horizontal_spacing, vertical_spacing),
+        "lights": (light_colors, light_distance_decay),
+        "beats": (beat_length, num_beats),
+        "frames": (INTRO_FRAMES, KEYSTROKE_FRAMES, LINE_HOLD_FRAMES, DATE_FRAMES),
+    }
+
+
+def chroma_promo(workers=1, codec=None, crf=18, preview=1, segment_workers=None, store_dir=None, soundtrack=False):
+    # preview=2 or 4 renders a draft at 1/2 or 1/4 scale, and only every 2nd or 4th glow frame.
+    # Frames are upscaled on output, so the draft has the same size and timing as the final video.
+    # With segment_workers (which needs a codec), each segment of the timeline is encoded in its
+    # own process and the segments are joined without re-encoding.
+    # With store_dir, frames are first rendered into a FrameStore there, so an interrupted render
+    # picks up where it stopped, and then encoded from the store.
+    # The soundtrack muxed in is audio/chroma_promo.wav as it is; soundtrack=True regenerates it
+    # from the clips first (or run chroma_promo_audio on its own).
+    if soundtrack:
+        chroma_promo_audio()
+
+    suffix = "" if preview == 1 else "_preview"
+    videodims = (SIDE_LENGTH-1,SIDE_LENGTH-1)
+
+    if segment_workers is not None:
+        encode_segments(
+            chroma_promo_segments(preview, split_beats=True),
+            f"videos/chroma_promo_with_audio{suffix}.mp4",
+            videodims,
+            FRAMERATE,
+            workers=segment_workers,
+            audio_path="audio/chroma_promo.wav",
+            codec=codec or "libx264",
+            crf=crf,
+            preview=preview,
+        )
+        return
+
+    if codec is None:
+        video = VideoSink(f"videos/chroma_promo{suffix}.mp4", videodims, FRAMERATE, preview=preview)
+    else:
+        # encodes and muxes the soundtrack in one pass, instead of stitch.sh
+        video = FFmpegSink(
+            f"videos/chroma_promo_with_audio{suffix}.mp4",
+            videodims,
+            FRAMERATE,
+            codec=codec,
+            crf=crf,
+            audio_path="audio/chroma_promo.wav",
+            preview=preview,
         )
-    write_image(date_img, 130)
+
+    if store_dir is None:
+        for segment, args in chroma_promo_segments(preview, workers):
+            segment(video, *args)
+    else:
+        store = FrameStore(store_dir, chroma_promo_params(preview), chroma_promo_frame_count(), promo_geometry(preview)[3])
+        for segment, args in chroma_promo_segments(preview, workers):
+            segment(store, *args)
+        store.release()
+        store.replay(video)
 
     video.release()
-    # audio.export("audio/chroma_promo.wav")
 
 
-def chroma_backdrop():
-    tile_width = 4
-    tile_height = 8
+def chroma_backdrop(tile_width=4, tile_height=8):
+    # Lit tiles are identical, so the tile is rendered once and pasted into the checkerboard. The
+    # PNG is written one row of tiles at a time, so memory doesn't grow with the tiling.
+    tile = Image.new('RGB', (SIDE_LENGTH, SIDE_LENGTH), color='black')
+    for _, c, xy in character_positions(text_lines):
+        glyphs.draw(tile, xy, c, "#ffffff", BungeeHairline)
 
     dims = SIDE_LENGTH*tile_width, SIDE_LENGTH*tile_height
 
-    img = Image.new('RGB', dims, color='black')
-    draw = ImageDraw.Draw(img)
-
-    for tx in range(tile_width):
+    with BandedPNGWriter(f"pngs/chroma_backdrop_{tile_width}x{tile_height}.png", dims) as png:
         for ty in range(tile_height):
-            if (tx + ty) % 2 != 0:
-                continue
-
-            for i, line in enumerate(text_lines):
-                for j, c in enumerate(line):
-
-                    x = (
-                            tx * SIDE_LENGTH
-                            + SIDE_LENGTH / 2
-                            + (-len(line) + 1 + 2 * j) * horizontal_spacing / 2
-                    )
-                    y = (
-                            ty * SIDE_LENGTH
-                            + SIDE_LENGTH / 2
-                            + (-len(text_lines) + 1 + 2 * i) * vertical_spacing / 2
-                    )
-
-                    draw.text(
-                        (x, y),
-                        text=c,
-                        fill="#ffffff",
-                        font=BungeeHairline,
-                        anchor="mm",
-                    )
-
-    img.save(f"pngs/chroma_backdrop_{tile_width}x{tile_height}.png")
+            band = Image.new('RGB', (dims[0], SIDE_LENGTH), color='black')
+            for tx in range(tile_width):
+                if (tx + ty) % 2 == 0:
+                    band.paste(tile, (tx * SIDE_LENGTH, 0))
+            png.write(band)
 
 
 if __name__ == "__main__":
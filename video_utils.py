@@ -0,0 +1,287 @@
+import hashlib
+import os
+import subprocess
+import tempfile
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+
+class FrameCache:
+    # Memoizes rendered frames by the parameters they depend on (e.g. the phase within a beat), so
+    # that periodic animations only render each distinct frame once.
+    def __init__(self, max_frames: int | None = None):
+        self.frames = OrderedDict()
+        self.max_frames = max_frames
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, render):
+        if key in self.frames:
+            self.hits += 1
+            self.frames.move_to_end(key)
+            return self.frames[key]
+
+        self.misses += 1
+        frame = render()
+        self.put(key, frame)
+        return frame
+
+    def put(self, key, frame):
+        self.frames[key] = frame
+        self.frames.move_to_end(key)
+        if self.max_frames is not None and len(self.frames) > self.max_frames:
+            self.frames.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self.frames
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits/total if total else 0.0
+
+    def report(self, name="frame"):
+        return f"{name} cache: {self.misses} rendered, {self.hits} reused ({self.hit_rate:.0%} hit rate)"
+
+
+def frame_region(im, box):
+    # the (left, top, right, bottom) region of a PIL image or array, as an array; cropping a PIL
+    # image first means only the region gets copied out of it
+    left, top, right, bottom = box
+    if isinstance(im, np.ndarray):
+        return im[top:bottom, left:right]
+    return np.asarray(im.crop(box))
+
+
+class FrameSink:
+    # Keeps the last written frame in an encoder-ready buffer. A held frame is converted once and
+    # the buffer is written for every frame of the hold. Writes can also pass the boxes that changed
+    # since the previous write (dirty=[] if nothing did), and then only those regions are converted.
+    # With preview > 1, frames are rendered at 1/preview scale and upscaled to dims.
+    bgr = False
+
+    def __init__(self, dims, preview=1):
+        width, height = dims
+        self.dims = dims
+        self.preview = preview
+        self.buffer = np.empty((height, width, 3), dtype=np.uint8)
+        self.buffered = False
+        self.total_frames = 0
+
+    def update(self, im, dirty=None):
+        # im can be a PIL image or an RGB uint8 array. Returns the encoder-ready frame.
+        if self.preview != 1:
+            im = cv2.resize(np.asarray(im), self.dims, interpolation=cv2.INTER_LINEAR)
+            dirty = None
+
+        if dirty is None or not self.buffered:
+            if self.bgr:
+                cv2.cvtColor(np.asarray(im), cv2.COLOR_RGB2BGR, dst=self.buffer)
+            elif isinstance(im, np.ndarray):
+                # already encoder-ready, so it's passed through without a copy
+                self.buffered = False
+                return np.ascontiguousarray(im, dtype=np.uint8)
+            else:
+                self.buffer[:] = np.asarray(im)
+            self.buffered = True
+            return self.buffer
+
+        width, height = self.dims
+        for left, top, right, bottom in dirty:
+            box = max(left, 0), max(top, 0), min(right, width), min(bottom, height)
+            if box[0] >= box[2] or box[1] >= box[3]:
+                continue
+            region = frame_region(im, box)
+            self.buffer[box[1]:box[3], box[0]:box[2]] = region[..., ::-1] if self.bgr else region
+        return self.buffer
+
+    def write(self, im, frames=1, dirty=None):
+        frame = self.update(im, dirty)
+        for _ in range(frames):
+            self.write_frame(frame)
+            self.total_frames += 1
+
+    def write_frame(self, frame):
+        raise NotImplementedError
+
+    def stored(self, position, frames=1):
+        # whether frames from position on are already written; only a FrameStore keeps them
+        return False
+
+    def seek(self, position):
+        if position != self.total_frames:
+            raise ValueError(f"{type(self).__name__} can only be written in order")
+
+
+class VideoSink(FrameSink):
+    # Wraps cv2.VideoWriter.
+    bgr = True
+
+    def __init__(self, path, dims, framerate, fourcc="XVID", preview=1):
+        super().__init__(dims, preview)
+        self.video = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), framerate, dims)
+
+    def write_frame(self, frame):
+        self.video.write(frame)
+
+    def release(self):
+        self.video.release()
+
+
+class FFmpegSink(FrameSink):
+    # Streams raw RGB frames to an ffmpeg subprocess over stdin, optionally muxing in an audio track
+    # in the same pass.
+    def __init__(self, path, dims, framerate, codec="libx264", crf: int | None = 18, pix_fmt="yuv420p",
+                 audio_path=None, audio_codec="aac", preview=1):
+        super().__init__(dims, preview)
+        width, height = dims
+
+        command = [
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(framerate), "-i", "-",
+        ]
+        if audio_path is not None:
+            command += ["-i", audio_path]
+
+        # chroma subsampled formats need even dimensions
+        command += ["-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-c:v", codec, "-pix_fmt", pix_fmt]
+        if crf is not None:
+            command += ["-crf", str(crf)]
+        if audio_path is not None:
+            command += ["-c:a", audio_codec]
+        command.append(path)
+
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    def write_frame(self, frame):
+        self.process.stdin.write(frame.data)
+
+    def release(self):
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise subprocess.CalledProcessError(self.process.returncode, self.process.args)
+
+
+class FrameStore(FrameSink):
+    # Keeps every frame of a render in an np.memmap on disk, with a flag per frame recording that it
+    # was written, so an interrupted render can resume and skip the frames it already has. The file
+    # names include a hash of the render parameters, so changing them starts a fresh store. Frames
+    # are read back straight from the map by replay(), e.g. into an encoder as a separate pass.
+    def __init__(self, directory, params, num_frames, dims):
+        super().__init__(dims)
+        width, height = dims
+        os.makedirs(directory, exist_ok=True)
+
+        key = hashlib.sha256(repr(params).encode()).hexdigest()[:16]
+        frames_path = os.path.join(directory, f"frames_{key}.npy")
+        written_path = os.path.join(directory, f"frames_{key}_written.npy")
+
+        # the written flags are created last, so if they exist the frames do too
+        mode = "r+" if os.path.exists(written_path) else "w+"
+        self.frames = np.lib.format.open_memmap(frames_path, mode=mode, dtype=np.uint8, shape=(num_frames, height, width, 3))
+        self.written = np.lib.format.open_memmap(written_path, mode=mode, dtype=np.bool_, shape=(num_frames,))
+
+    def write_frame(self, frame):
+        self.frames[self.total_frames] = frame
+        self.written[self.total_frames] = True
+
+    def stored(self, position, frames=1):
+        return bool(self.written[position:position + frames].all())
+
+    def seek(self, position):
+        self.total_frames = position
+        # the buffer no longer holds the previous frame, so the next write can't be a dirty update
+        self.buffered = False
+
+    def replay(self, video):
+        missing = np.flatnonzero(~self.written)
+        if len(missing):
+            raise ValueError(f"{len(missing)} frames were never rendered, starting at frame {missing[0]}")
+        for frame in self.frames:
+            video.write(frame)
+
+    def release(self):
+        self.frames.flush()
+        self.written.flush()
+
+
+def render_frames(render_frame, keys, write, workers=1, window=None, cache=None, initializer=None, initargs=()):
+    # Renders render_frame(key) for each key and passes the frames to write() in order.
+    # With more than one worker, frames are rendered in a process pool (so render_frame and
+    # initializer must be picklable module-level functions) and at most `window` frames are in
+    # flight at once, so memory stays flat however long the timeline is. If a cache is given,
+    # repeated keys are only rendered once.
+    if workers == 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for key in keys:
+            if cache is None:
+                write(render_frame(key))
+            else:
+                write(cache.get(key, lambda: render_frame(key)))
+        return
+
+    workers = workers or os.cpu_count()
+    window = window or 2*workers
+    queue = deque()
+
+    def emit():
+        key, item = queue.popleft()
+        if isinstance(item, Future):
+            frame = item.result()
+            # the cache holds the future until it resolves; swap in the frame itself
+            if cache is not None and cache.frames.get(key) is item:
+                cache.put(key, frame)
+        else:
+            frame = item
+        write(frame)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as pool:
+        for key in keys:
+            if cache is None:
+                item = pool.submit(render_frame, key)
+            else:
+                item = cache.get(key, lambda: pool.submit(render_frame, key))
+            queue.append((key, item))
+
+            while len(queue) >= window:
+                emit()
+
+        while queue:
+            emit()
+
+
+def _encode_segment(path, dims, framerate, sink_args, segment, args):
+    video = FFmpegSink(path, dims, framerate, **sink_args)
+    segment(video, *args)
+    video.release()
+
+
+def encode_segments(segments, path, dims, framerate, workers=None, audio_path=None, audio_codec="aac", **sink_args):
+    # Encodes each (segment, args) of a timeline in its own process, where segment(sink, *args)
+    # writes that segment's frames to an FFmpegSink, then joins the segments with ffmpeg's concat
+    # demuxer without re-encoding the video. Segments must be picklable module-level functions.
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        segment_paths = [os.path.join(tmp_dir, f"segment_{i:04d}.mp4") for i in range(len(segments))]
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_encode_segment, segment_path, dims, framerate, sink_args, segment, args)
+                for segment_path, (segment, args) in zip(segment_paths, segments)
+            ]
+            for future in futures:
+                future.result()
+
+        list_path = os.path.join(tmp_dir, "segments.txt")
+        with open(list_path, "w") as fh:
+            for segment_path in segment_paths:
+                fh.write(f"file '{segment_path}'\n")
+
+        command = ["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_path]
+        if audio_path is not None:
+            command += ["-i", audio_path, "-c:a", audio_codec]
+        command += ["-c:v", "copy", path]
+        subprocess.run(command, check=True)